@@ -0,0 +1,116 @@
+"""
+Batch analysis of many positions on a pool of worker processes. Positions are read one per line from a FEN or EPD file,
+searched by the workers (each one has its own GameState, transposition table and move ordering tables) and the results
+are written back as tab separated lines: index, id, best move, score, depth, nodes, time, fen.
+
+python BatchAnalysis.py positions.epd --depth 4                 (results in input order, one worker per core)
+python BatchAnalysis.py positions.fen --time 0.5 --workers 8    (half a second per position on 8 workers)
+python BatchAnalysis.py positions.epd --unordered -o out.tsv    (results as soon as they are ready)
+
+The file is streamed: at most --max-pending positions are waiting in the pool at any time, so a huge file doesn't get
+loaded into memory and the reader never runs far ahead of the workers.
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+
+import SmartMoveFinder
+import TranspositionTable
+import EPD
+
+# (index, id, best move, score, completed depth, nodes, seconds, fen, error)
+AnalysisResult = collections.namedtuple('AnalysisResult', 'index id move score depth nodes time fen error')
+
+# settings and searcher of a worker process, built once by setupWorker
+Worker = collections.namedtuple('Worker', 'backend depth timeLimit maxNodes searcher')
+
+'''
+Runs once in every worker process
+'''
+def setupWorker(backend, depth, timeLimit, maxNodes, hashMB):
+    return Worker(EPD.BACKENDS[backend], depth, timeLimit, maxNodes,
+                  SmartMoveFinder.Searcher(TranspositionTable.TranspositionTable(hashMB)))
+
+
+'''
+Search one position in the worker. The tables are cleared first so the result only depends on the position, not on which
+positions the same worker happened to search before. A malformed position gives a result with the error set, whether
+the FEN can't be read or it can but isn't a position the engine can play (a pawn on the back rank, say), so one bad
+line never ends the whole batch.
+'''
+def analyzePosition(worker, task):
+    index, fen, positionId = task
+    searcher = worker.searcher
+    start = time.perf_counter()
+    try:
+        gs = worker.backend.fromFEN(fen)
+        searcher.clear()
+        move = searcher.findBestMove(gs, gs.getValidMoves(), worker.depth, timeLimit=worker.timeLimit, maxNodes=worker.maxNodes)
+    except Exception as e:
+        return AnalysisResult(index, positionId, None, None, 0, 0, time.perf_counter() - start, fen,
+                              str(e) if isinstance(e, ValueError) else type(e).__name__ + ': ' + str(e))
+    elapsed = time.perf_counter() - start
+    if move is None: # checkmate or stalemate, nothing to search
+        score = -SmartMoveFinder.CHECKMATE if gs.isCheckmate() else SmartMoveFinder.STALEMATE
+        return AnalysisResult(index, positionId, None, score, 0, 0, elapsed, fen, None)
+    return AnalysisResult(index, positionId, move.getChessNotation(), searcher.bestScore, searcher.completedDepth,
+                          searcher.nodes, elapsed, fen, None)
+
+
+'''
+Analyze (index, fen, id) positions on a pool of worker processes and yield an AnalysisResult for each of them, in input
+order or, with ordered=False, as soon as each one is done. Positions are taken from the iterable only when fewer than
+maxPending of them are waiting in the pool.
+'''
+def analyzePositions(positions, workers=None, depth=SmartMoveFinder.DEPTH, timeLimit=None, maxNodes=None,
+                     backend='bitboard', hashMB=16, ordered=True, maxPending=None):
+    return EPD.runOnPool(analyzePosition, positions, setupWorker, (backend, depth, timeLimit, maxNodes, hashMB), workers,
+                         ordered, maxPending)
+
+
+def formatResult(result):
+    if result.error is not None:
+        return '\t'.join((str(result.index), result.id, 'error', result.error, '', '', '', result.fen))
+    return '\t'.join((str(result.index), result.id, result.move or '-', SmartMoveFinder.formatScore(result.score), str(result.depth),
+                      str(result.nodes), '%.3f' % result.time, result.fen))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search every position of a FEN or EPD file on a pool of processes.')
+    parser.add_argument('file', help='positions, one FEN or EPD per line')
+    parser.add_argument('-o', '--output', help='write the results to this file instead of standard output')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: one per core)')
+    parser.add_argument('--depth', type=int, help='search depth in plies (default: %d, or unlimited with --time or --nodes)' % SmartMoveFinder.DEPTH)
+    parser.add_argument('--time', type=float, help='seconds per position')
+    parser.add_argument('--nodes', type=int, help='nodes per position')
+    parser.add_argument('--backend', choices=sorted(EPD.BACKENDS), default='bitboard', help='GameState implementation to use')
+    parser.add_argument('--hash', type=int, default=16, help='transposition table size per worker in MB (default: 16)')
+    parser.add_argument('--unordered', action='store_true', help='write results as they finish instead of in input order')
+    parser.add_argument('--max-pending', type=int, help='positions waiting in the pool at most (default: %d per worker)' % EPD.PENDING_PER_WORKER)
+    args = parser.parse_args()
+    depth = args.depth
+    if depth is None:
+        depth = SmartMoveFinder.MAX_DEPTH if args.time is not None or args.nodes is not None else SmartMoveFinder.DEPTH
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    count = 0
+    totalNodes = 0
+    start = time.perf_counter()
+    try:
+        for result in analyzePositions(EPD.readPositions(args.file), args.workers, depth, args.time, args.nodes,
+                                       args.backend, args.hash, not args.unordered, args.max_pending):
+            output.write(formatResult(result) + '\n')
+            count += 1
+            totalNodes += result.nodes
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    print('%d positions in %.3fs on %d workers (%.2f positions/sec, %d nodes/sec)' % (count, elapsed, args.workers,
+          count / elapsed if elapsed > 0 else 0, totalNodes / elapsed if elapsed > 0 else 0), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
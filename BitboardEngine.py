@@ -0,0 +1,703 @@
+"""
+Bitboard backend for the chess engine. The position is kept as 64-bit integers (one per piece type and color plus
+occupancy boards) and a flat list of the 64 squares, and legal moves are generated with precomputed attack tables instead
+of walking the string board square by square. It exposes the same API as ChessEngine.GameState (makeMove, undoMove,
+getValidMoves and their packed-move versions) so it can be swapped in wherever a GameState is used.
+
+The bitboards and the square list are the main state: makeMoveCode/undoMoveCode update them, the Zobrist key, the
+evaluation scores and the logs directly, and the 8x8 board is only built when something reads it (FEN, SAN, move
+ordering, the GUI). Perft 4 of the start position takes about 0.27s here against 0.54s on the string backend, perft 3 of
+kiwipete 0.12s against 0.18s, and a depth 3 search of the first six perft positions 0.8s against 1.4s. Most of the time left
+goes into emitting the moves one at a time.
+
+Squares are numbered row * 8 + col, so bit 0 is a8 (row 0, col 0) and bit 63 is h1 (row 7, col 7).
+"""
+import ChessEngine
+from ChessEngine import EN_PASSANT_MOVE, CASTLE_MOVE, PROMOTION_MOVE, PROMOTION_PIECES, SQUARES, ZOBRIST_PIECES, \
+    ZOBRIST_BLACK_TO_MOVE
+from Evaluation import MG_SCORES, EG_SCORES, PHASES
+
+FULL_BOARD = (1 << 64) - 1
+PIECE_TYPES = ('P', 'N', 'B', 'R', 'Q', 'K')
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+RANK_3 = 0xFF << 40 # row 5
+RANK_6 = 0xFF << 16 # row 2
+BACK_RANKS = 0xFF | (0xFF << 56)
+LIGHT_SQUARES = sum(1 << (r * 8 + c) for r in range(8) for c in range(8) if (r + c) % 2 == 0)
+
+
+def squareIndex(r, c):
+    return r * 8 + c
+
+
+def bitScanForward(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def bitScanReverse(bb):
+    return bb.bit_length() - 1
+
+
+'''
+Build the squares reachable from every square by the given (row, col) offsets, one step only
+'''
+def buildStepAttacks(offsets):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for dr, dc in offsets:
+            endRow = r + dr
+            endCol = c + dc
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                bb |= 1 << squareIndex(endRow, endCol)
+        table.append(bb)
+    return table
+
+
+'''
+Build the ray from every square in the given direction up to the edge of the board (the square itself excluded)
+'''
+def buildRays(d):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        bb = 0
+        for i in range(1, 8):
+            endRow = r + d[0] * i
+            endCol = c + d[1] * i
+            if not (0 <= endRow < 8 and 0 <= endCol < 8):
+                break
+            bb |= 1 << squareIndex(endRow, endCol)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = buildStepAttacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = buildStepAttacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# squares attacked by a pawn of the given color standing on a square (white pawns move towards row 0)
+PAWN_ATTACKS = {'w': buildStepAttacks(((-1, -1), (-1, 1))), 'b': buildStepAttacks(((1, -1), (1, 1)))}
+
+# rays per direction; a direction is "positive" when it walks towards higher square indexes, so the closest blocker
+# on the ray is the lowest set bit, otherwise it is the highest set bit
+ROOK_RAYS = [(buildRays(d), d[0] > 0 or (d[0] == 0 and d[1] > 0)) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(buildRays(d), d[0] > 0) for d in BISHOP_DIRECTIONS]
+
+# squares strictly between two squares on the same rank, file or diagonal (0 if they are not aligned)
+BETWEEN = [[0] * 64 for _ in range(64)]
+for rays, positive in ROOK_RAYS + BISHOP_RAYS:
+    for sq in range(64):
+        ray = rays[sq]
+        while ray:
+            target = bitScanForward(ray) if positive else bitScanReverse(ray)
+            BETWEEN[sq][target] = rays[sq] & ~rays[target] & ~(1 << target)
+            ray &= ~(1 << target)
+
+
+def slidingAttacks(sq, occupied, directionRays):
+    attacks = 0
+    for rays, positive in directionRays:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[bitScanForward(blockers) if positive else bitScanReverse(blockers)]
+        attacks |= ray
+    return attacks
+
+
+'''
+Sliding attacks of every square as two table lookups: the rays are taken two by two, and for each pair there is the mask
+of the squares whose occupancy matters (the rays without their last square, a blocker there changes nothing) and a dict
+from every occupancy of that mask to the squares attacked along the pair
+'''
+def buildLineAttacks(directionRays):
+    table = []
+    for sq in range(64):
+        lines = []
+        for i in range(0, len(directionRays), 2):
+            pair = directionRays[i:i + 2]
+            mask = 0
+            for rays, positive in pair:
+                ray = rays[sq]
+                if ray:
+                    mask |= ray & ~(1 << (bitScanReverse(ray) if positive else bitScanForward(ray)))
+            attacks = {}
+            occupied = 0
+            while True: # every subset of mask
+                attacks[occupied] = slidingAttacks(sq, occupied, pair)
+                occupied = (occupied - mask) & mask
+                if occupied == 0:
+                    break
+            lines.append((mask, attacks))
+        table.append(tuple(lines))
+    return table
+
+
+ROOK_LINES = buildLineAttacks(ROOK_RAYS)
+BISHOP_LINES = buildLineAttacks(BISHOP_RAYS)
+
+
+# PAWN_ROW_MOVES[offset][row][targets]: the packed moves of the pawns reaching the target columns (a byte) of a row
+# by moving offset squares
+PAWN_ROW_MOVES = {}
+for offset in (-16, -9, -8, -7, 7, 8, 9, 16):
+    PAWN_ROW_MOVES[offset] = [[tuple(endSq - offset | endSq << 6 for endSq in range(row * 8, row * 8 + 8)
+                                     if targets & (1 << (endSq & 7)) and 0 <= endSq - offset < 64)
+                               for targets in range(256)] for row in range(8)]
+
+
+def rookAttacks(sq, occupied):
+    (mask1, attacks1), (mask2, attacks2) = ROOK_LINES[sq]
+    return attacks1[occupied & mask1] | attacks2[occupied & mask2]
+
+
+def bishopAttacks(sq, occupied):
+    (mask1, attacks1), (mask2, attacks2) = BISHOP_LINES[sq]
+    return attacks1[occupied & mask1] | attacks2[occupied & mask2]
+
+
+# castling rights as bits of one int, in the order of ChessEngine.ZOBRIST_CASTLE
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+CASTLE_KEYS = [0] * 16 # Zobrist key of every combination of castling rights
+for rights in range(16):
+    for i in range(4):
+        if rights & (1 << i):
+            CASTLE_KEYS[rights] ^= ChessEngine.ZOBRIST_CASTLE[i]
+# castling rights kept when a move starts or ends on a square: moving the king or a rook from its home square, or
+# capturing a rook on it, loses the rights that need it
+CASTLE_KEEP = [15] * 64
+CASTLE_KEEP[squareIndex(7, 4)] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLE_KEEP[squareIndex(7, 7)] = 15 & ~WHITE_KINGSIDE
+CASTLE_KEEP[squareIndex(7, 0)] = 15 & ~WHITE_QUEENSIDE
+CASTLE_KEEP[squareIndex(0, 4)] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLE_KEEP[squareIndex(0, 7)] = 15 & ~BLACK_KINGSIDE
+CASTLE_KEEP[squareIndex(0, 0)] = 15 & ~BLACK_QUEENSIDE
+
+
+'''
+One of the four castling rights of GameState (whiteCastleKingside...) read from and written to the castling bits
+'''
+def castleRightProperty(bit):
+    def getRight(self):
+        return self.castling & bit != 0
+
+    def setRight(self, value):
+        self.castling = self.castling | bit if value else self.castling & ~bit
+    return property(getRight, setRight)
+
+
+class BitboardGameState(ChessEngine.GameState):
+    trackAttacks = False # attacks come from the bitboards, the 8x8 attack maps aren't needed
+    castling = 0
+    whiteCastleKingside = castleRightProperty(WHITE_KINGSIDE)
+    whiteCastleQueenside = castleRightProperty(WHITE_QUEENSIDE)
+    blackCastleKingside = castleRightProperty(BLACK_KINGSIDE)
+    blackCastleQueenside = castleRightProperty(BLACK_QUEENSIDE)
+
+    '''
+    The 8x8 board is built from squares when it is asked for, and kept until the next move is made or taken back
+    '''
+    @property
+    def board(self):
+        if self.boardCache is None:
+            squares = self.squares
+            self.boardCache = [squares[i:i + 8] for i in range(0, 64, 8)]
+        return self.boardCache
+
+    '''
+    A board is only assigned when a position is set up (GameState.__init__ and loadFEN): squares and the bitboards are
+    loaded from it and the logs of this class start over
+    '''
+    @board.setter
+    def board(self, board):
+        self.squares = [piece for row in board for piece in row]
+        self.boardCache = None
+        self.boardLog = []
+        self.castlingLog = []
+        self.loadBitboards()
+
+    '''
+    Rebuild every bitboard from squares
+    '''
+    def loadBitboards(self):
+        self.pieceBoards = {color + piece: 0 for color in 'wb' for piece in PIECE_TYPES}
+        self.colorBoards = {'w': 0, 'b': 0}
+        for sq, piece in enumerate(self.squares):
+            if piece != '--':
+                self.pieceBoards[piece] |= 1 << sq
+                self.colorBoards[piece[0]] |= 1 << sq
+        self.occupied = self.colorBoards['w'] | self.colorBoards['b']
+
+    def getCastleKey(self):
+        return CASTLE_KEYS[self.castling]
+
+    '''
+    Same rule as GameState.getEnPassantKey: the en-passant square only counts when a pawn of the side to move can
+    capture on it
+    '''
+    def getEnPassantKey(self):
+        if self.enPassantPossible == ():
+            return 0
+        r, c = self.enPassantPossible
+        if self.whiteToMove:
+            attackers = PAWN_ATTACKS['b'][r * 8 + c] & self.pieceBoards['wP']
+        else:
+            attackers = PAWN_ATTACKS['w'][r * 8 + c] & self.pieceBoards['bP']
+        return ChessEngine.ZOBRIST_EN_PASSANT[c] if attackers else 0
+
+    '''
+    Makes the packed move on squares and the bitboards, and updates the Zobrist key, the evaluation scores and the logs
+    the way GameState.makeMoveCode does
+    '''
+    def makeMoveCode(self, code):
+        squares = self.squares
+        pb = self.pieceBoards
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        flag = (code >> 12) & 3
+        pieceMoved = squares[startSq]
+        color = pieceMoved[0]
+        capturedSq = (startSq & ~7) | (endSq & 7) if flag == EN_PASSANT_MOVE else endSq
+        pieceCaptured = squares[capturedSq]
+        placedPiece = color + PROMOTION_PIECES[code >> 14] if flag == PROMOTION_MOVE else pieceMoved
+
+        key = self.zobristKey ^ self.getEnPassantKey() ^ CASTLE_KEYS[self.castling] ^ ZOBRIST_BLACK_TO_MOVE ^ \
+              ZOBRIST_PIECES[pieceMoved][startSq] ^ ZOBRIST_PIECES[placedPiece][endSq]
+        self.scoreLog.append((self.mgScore, self.egScore, self.phase))
+        mgScore = self.mgScore - MG_SCORES[pieceMoved][startSq] + MG_SCORES[placedPiece][endSq]
+        egScore = self.egScore - EG_SCORES[pieceMoved][startSq] + EG_SCORES[placedPiece][endSq]
+        phase = self.phase + PHASES[placedPiece] - PHASES[pieceMoved]
+
+        startBit = 1 << startSq
+        endBit = 1 << endSq
+        pb[pieceMoved] ^= startBit
+        pb[placedPiece] ^= endBit
+        colorBits = startBit | endBit # squares whose color board changes
+        squares[startSq] = '--'
+        if pieceCaptured != '--':
+            key ^= ZOBRIST_PIECES[pieceCaptured][capturedSq]
+            mgScore -= MG_SCORES[pieceCaptured][capturedSq]
+            egScore -= EG_SCORES[pieceCaptured][capturedSq]
+            phase -= PHASES[pieceCaptured]
+            capturedBit = 1 << capturedSq
+            pb[pieceCaptured] ^= capturedBit
+            self.colorBoards[pieceCaptured[0]] ^= capturedBit
+            squares[capturedSq] = '--'
+        squares[endSq] = placedPiece
+        if flag == CASTLE_MOVE:
+            rook = color + 'R'
+            if endSq > startSq: # kingside
+                rookStart, rookEnd = endSq + 1, endSq - 1
+            else: # queenside
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            rookBits = (1 << rookStart) | (1 << rookEnd)
+            pb[rook] ^= rookBits
+            colorBits ^= rookBits
+            squares[rookStart] = '--'
+            squares[rookEnd] = rook
+            key ^= ZOBRIST_PIECES[rook][rookStart] ^ ZOBRIST_PIECES[rook][rookEnd]
+            mgScore += MG_SCORES[rook][rookEnd] - MG_SCORES[rook][rookStart]
+            egScore += EG_SCORES[rook][rookEnd] - EG_SCORES[rook][rookStart]
+        self.colorBoards[color] ^= colorBits
+        self.occupied = self.colorBoards['w'] | self.colorBoards['b']
+        self.mgScore = mgScore
+        self.egScore = egScore
+        self.phase = phase
+
+        self.codeLog.append(code)
+        self.capturedLog.append(pieceCaptured)
+        self.whiteToMove = not self.whiteToMove
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if pieceMoved[1] == 'P' or pieceCaptured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if color == 'b':
+            self.fullmoveNumber += 1
+        if pieceMoved[1] == 'K':
+            if color == 'w':
+                self.whiteKingLocation = SQUARES[endSq]
+            else:
+                self.blackKingLocation = SQUARES[endSq]
+        if pieceMoved[1] == 'P' and (endSq - startSq == 16 or startSq - endSq == 16):
+            self.enPassantPossible = SQUARES[(startSq + endSq) // 2]
+        else:
+            self.enPassantPossible = ()
+        self.enPassantLog.append(self.enPassantPossible)
+        self.castlingLog.append(self.castling)
+        self.castling &= CASTLE_KEEP[startSq] & CASTLE_KEEP[endSq]
+
+        self.zobristKey = key ^ self.getEnPassantKey() ^ CASTLE_KEYS[self.castling]
+        self.zobristLog.append(self.zobristKey)
+        self.boardLog.append(self.boardCache) # a cached board is never changed, so it is still right after undo
+        self.boardCache = None
+        if self.debugIncremental:
+            self.checkIncrementalState('makeMove ' + ChessEngine.moveNotation(code))
+
+    '''
+    Takes back the last packed move
+    '''
+    def undoMoveCode(self):
+        if len(self.codeLog) == 0:
+            return
+        squares = self.squares
+        pb = self.pieceBoards
+        code = self.codeLog.pop()
+        pieceCaptured = self.capturedLog.pop()
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        flag = (code >> 12) & 3
+        placedPiece = squares[endSq]
+        color = placedPiece[0]
+        pieceMoved = color + 'P' if flag == PROMOTION_MOVE else placedPiece
+
+        startBit = 1 << startSq
+        endBit = 1 << endSq
+        pb[placedPiece] ^= endBit
+        pb[pieceMoved] ^= startBit
+        colorBits = startBit | endBit
+        squares[endSq] = '--'
+        squares[startSq] = pieceMoved
+        if pieceCaptured != '--':
+            capturedSq = (startSq & ~7) | (endSq & 7) if flag == EN_PASSANT_MOVE else endSq
+            capturedBit = 1 << capturedSq
+            pb[pieceCaptured] ^= capturedBit
+            self.colorBoards[pieceCaptured[0]] ^= capturedBit
+            squares[capturedSq] = pieceCaptured
+        if flag == CASTLE_MOVE:
+            rook = color + 'R'
+            if endSq > startSq: # kingside
+                rookStart, rookEnd = endSq + 1, endSq - 1
+            else: # queenside
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            rookBits = (1 << rookStart) | (1 << rookEnd)
+            pb[rook] ^= rookBits
+            colorBits ^= rookBits
+            squares[rookEnd] = '--'
+            squares[rookStart] = rook
+        self.colorBoards[color] ^= colorBits
+        self.occupied = self.colorBoards['w'] | self.colorBoards['b']
+
+        self.whiteToMove = not self.whiteToMove
+        self.halfmoveClock = self.halfmoveClockLog.pop()
+        if color == 'b':
+            self.fullmoveNumber -= 1
+        if pieceMoved[1] == 'K':
+            if color == 'w':
+                self.whiteKingLocation = SQUARES[startSq]
+            else:
+                self.blackKingLocation = SQUARES[startSq]
+        self.enPassantLog.pop()
+        self.enPassantPossible = self.enPassantLog[-1]
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
+        self.mgScore, self.egScore, self.phase = self.scoreLog.pop()
+        self.castling = self.castlingLog.pop()
+        self.boardCache = self.boardLog.pop()
+        if self.debugIncremental:
+            self.checkIncrementalState('undoMove ' + ChessEngine.moveNotation(code))
+
+    '''
+    GameState.checkIncrementalState, and the bitboards against squares
+    '''
+    def checkIncrementalState(self, context):
+        super().checkIncrementalState(context)
+        pieceBoards, colorBoards = self.pieceBoards, self.colorBoards
+        self.loadBitboards()
+        if (pieceBoards, colorBoards) != (self.pieceBoards, self.colorBoards):
+            raise RuntimeError('bitboards out of sync after ' + context)
+
+    '''
+    Bitboard of the pieces of the given color attacking square sq with the given occupancy
+    '''
+    def attackersTo(self, sq, color, occupied):
+        pb = self.pieceBoards
+        enemy = 'b' if color == 'w' else 'w'
+        queens = pb[color + 'Q']
+        return (PAWN_ATTACKS[enemy][sq] & pb[color + 'P']) | \
+               (KNIGHT_ATTACKS[sq] & pb[color + 'N']) | \
+               (KING_ATTACKS[sq] & pb[color + 'K']) | \
+               (bishopAttacks(sq, occupied) & (pb[color + 'B'] | queens)) | \
+               (rookAttacks(sq, occupied) & (pb[color + 'R'] | queens))
+
+    def squareAttacked(self, sq, color, occupied):
+        pb = self.pieceBoards
+        enemy = 'b' if color == 'w' else 'w'
+        if PAWN_ATTACKS[enemy][sq] & pb[color + 'P'] or KNIGHT_ATTACKS[sq] & pb[color + 'N'] or \
+                KING_ATTACKS[sq] & pb[color + 'K']:
+            return True
+        queens = pb[color + 'Q']
+        if bishopAttacks(sq, occupied) & (pb[color + 'B'] | queens):
+            return True
+        return bool(rookAttacks(sq, occupied) & (pb[color + 'R'] | queens))
+
+    '''
+    Returns a dict mapping the square of every piece pinned to the king to the squares it may still move to
+    '''
+    def getPinMasks(self, kingSq, allyColor, enemyColor):
+        pb = self.pieceBoards
+        allies = self.colorBoards[allyColor]
+        enemyQueens = pb[enemyColor + 'Q']
+        pinMasks = {}
+        for directionRays, sliders in ((ROOK_RAYS, pb[enemyColor + 'R'] | enemyQueens),
+                                       (BISHOP_RAYS, pb[enemyColor + 'B'] | enemyQueens)):
+            for rays, positive in directionRays:
+                ray = rays[kingSq]
+                if not ray & sliders:
+                    continue
+                blockers = ray & self.occupied
+                first = bitScanForward(blockers) if positive else bitScanReverse(blockers)
+                if not (1 << first) & allies:
+                    continue
+                blockers &= ~(1 << first)
+                if not blockers:
+                    continue
+                second = bitScanForward(blockers) if positive else bitScanReverse(blockers)
+                if (1 << second) & sliders:
+                    pinMasks[first] = BETWEEN[kingSq][second] | (1 << second)
+        return pinMasks
+
+    '''
+    Legal captures (with en-passant and promotions) and/or quiet moves (with castling), see GameState.generateMoves
+    '''
+    def generateMoves(self, moves, captures, quiets):
+        del moves[:]
+        pb = self.pieceBoards
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+        else:
+            allyColor, enemyColor = 'b', 'w'
+        occupied = self.occupied
+        # squares the pieces may move to in this stage
+        stageTargets = (self.colorBoards[enemyColor] if captures else 0) | (~occupied & FULL_BOARD if quiets else 0)
+        kingSq = bitScanForward(pb[allyColor + 'K'])
+        checkers = self.attackersTo(kingSq, enemyColor, occupied)
+        self.inCheck = checkers != 0
+        self.addKingMoves(kingSq, FULL_BOARD & ~stageTargets, enemyColor, moves)
+
+        if checkers & (checkers - 1) == 0: # not in double check, so other pieces may move too
+            if checkers:
+                checkMask = checkers | BETWEEN[kingSq][bitScanForward(checkers)]
+            else:
+                checkMask = FULL_BOARD
+                if quiets:
+                    self.addCastleMoves(kingSq, allyColor, enemyColor, moves)
+            pinMasks = self.getPinMasks(kingSq, allyColor, enemyColor)
+            targets = stageTargets & checkMask
+            self.addPawnMoves(allyColor, enemyColor, kingSq, checkMask, pinMasks, moves, captures, quiets)
+            self.addPieceMoves(pb[allyColor + 'N'], KNIGHT_ATTACKS, None, targets, pinMasks, moves)
+            self.addPieceMoves(pb[allyColor + 'B'] | pb[allyColor + 'Q'], None, bishopAttacks, targets, pinMasks, moves)
+            self.addPieceMoves(pb[allyColor + 'R'] | pb[allyColor + 'Q'], None, rookAttacks, targets, pinMasks, moves)
+        return moves
+
+    '''
+    Whether the side to move is in check, from the attackers of its king. Sets inCheck.
+    '''
+    def kingInCheck(self):
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+        else:
+            allyColor, enemyColor = 'b', 'w'
+        self.inCheck = self.attackersTo(bitScanForward(self.pieceBoards[allyColor + 'K']), enemyColor, self.occupied) != 0
+        return self.inCheck
+
+    '''
+    Whether the side to move has a legal move, stopping at the first piece that has one. Sets inCheck.
+    '''
+    def hasLegalMove(self):
+        pb = self.pieceBoards
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+        else:
+            allyColor, enemyColor = 'b', 'w'
+        allies = self.colorBoards[allyColor]
+        kingSq = bitScanForward(pb[allyColor + 'K'])
+        checkers = self.attackersTo(kingSq, enemyColor, self.occupied)
+        self.inCheck = checkers != 0
+        moves = []
+        self.addKingMoves(kingSq, allies, enemyColor, moves) # castling needs a legal king step, so it can't add anything
+        if len(moves) > 0:
+            return True
+        if checkers & (checkers - 1): # double check
+            return False
+        checkMask = checkers | BETWEEN[kingSq][bitScanForward(checkers)] if checkers else FULL_BOARD
+        pinMasks = self.getPinMasks(kingSq, allyColor, enemyColor)
+        targets = ~allies & checkMask
+        if self.hasPieceMove(pb[allyColor + 'N'], KNIGHT_ATTACKS, None, targets, pinMasks) or \
+                self.hasPieceMove(pb[allyColor + 'B'] | pb[allyColor + 'Q'], None, bishopAttacks, targets, pinMasks) or \
+                self.hasPieceMove(pb[allyColor + 'R'] | pb[allyColor + 'Q'], None, rookAttacks, targets, pinMasks):
+            return True
+        self.addPawnMoves(allyColor, enemyColor, kingSq, checkMask, pinMasks, moves)
+        return len(moves) > 0
+
+    '''
+    Same rule as GameState.isInsufficientMaterial, straight from the bitboards (any number of same colored bishops)
+    '''
+    def isInsufficientMaterial(self):
+        pb = self.pieceBoards
+        if pb['wP'] | pb['bP'] | pb['wR'] | pb['bR'] | pb['wQ'] | pb['bQ']:
+            return False
+        bishops = pb['wB'] | pb['bB']
+        minors = bishops | pb['wN'] | pb['bN']
+        if minors & (minors - 1) == 0: # at most one minor piece
+            return True
+        return minors == bishops and (bishops & LIGHT_SQUARES == 0 or bishops & ~LIGHT_SQUARES == 0)
+
+    def hasPieceMove(self, pieces, stepTable, attackFunction, targets, pinMasks):
+        occupied = self.occupied
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            sq = low.bit_length() - 1
+            attacks = (stepTable[sq] if stepTable is not None else attackFunction(sq, occupied)) & targets
+            if sq in pinMasks:
+                attacks &= pinMasks[sq]
+            if attacks:
+                return True
+        return False
+
+    def addMovesTo(self, startSq, targets, moves):
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            moves.append(startSq | (low.bit_length() - 1) << 6)
+
+    '''
+    Moves of knights, bishops, rooks and queens: either a step table or a sliding attack function is given
+    '''
+    def addPieceMoves(self, pieces, stepTable, attackFunction, targets, pinMasks, moves):
+        occupied = self.occupied
+        while pieces:
+            low = pieces & -pieces
+            pieces ^= low
+            sq = low.bit_length() - 1
+            if stepTable is not None:
+                attacks = stepTable[sq]
+            else:
+                attacks = attackFunction(sq, occupied)
+            attacks &= targets
+            if sq in pinMasks:
+                attacks &= pinMasks[sq]
+            while attacks: # addMovesTo inlined, this is the hottest loop of move generation
+                low = attacks & -attacks
+                attacks ^= low
+                moves.append(sq | (low.bit_length() - 1) << 6)
+
+    '''
+    King moves to squares that aren't in excluded (the king's own pieces, and the squares of the other stage)
+    '''
+    def addKingMoves(self, kingSq, excluded, enemyColor, moves):
+        occupied = self.occupied & ~(1 << kingSq) # the king must not hide behind itself on a checking ray
+        targets = KING_ATTACKS[kingSq] & ~excluded
+        safe = 0
+        while targets:
+            low = targets & -targets
+            targets ^= low
+            if not self.squareAttacked(low.bit_length() - 1, enemyColor, occupied):
+                safe |= low
+        self.addMovesTo(kingSq, safe, moves)
+
+    def addCastleMoves(self, kingSq, allyColor, enemyColor, moves):
+        if allyColor == 'w':
+            kingside, queenside = self.castling & WHITE_KINGSIDE, self.castling & WHITE_QUEENSIDE
+        else:
+            kingside, queenside = self.castling & BLACK_KINGSIDE, self.castling & BLACK_QUEENSIDE
+        c = kingSq & 7
+        occupied = self.occupied
+        rook = self.pieceBoards[allyColor + 'R']
+        if kingside and c == 4 and rook & (1 << (kingSq + 3)) and not occupied & (0b11 << (kingSq + 1)):
+            if not self.squareAttacked(kingSq + 1, enemyColor, occupied) and \
+                    not self.squareAttacked(kingSq + 2, enemyColor, occupied):
+                moves.append(kingSq | (kingSq + 2) << 6 | CASTLE_MOVE << 12)
+        if queenside and c == 4 and rook & (1 << (kingSq - 4)) and not occupied & (0b111 << (kingSq - 3)):
+            if not self.squareAttacked(kingSq - 1, enemyColor, occupied) and \
+                    not self.squareAttacked(kingSq - 2, enemyColor, occupied):
+                moves.append(kingSq | (kingSq - 2) << 6 | CASTLE_MOVE << 12)
+
+    '''
+    Pawn moves are generated for all pawns at once by shifting the pawn bitboard, and each target is then mapped back to
+    the pawn it came from (step is the square offset of a single push)
+    '''
+    def addPawnMoves(self, allyColor, enemyColor, kingSq, checkMask, pinMasks, moves, captures=True, quiets=True):
+        pawns = self.pieceBoards[allyColor + 'P']
+        enemies = self.colorBoards[enemyColor] & checkMask
+        empty = ~self.occupied & FULL_BOARD
+        if allyColor == 'w':
+            step = -8
+            singles = (pawns >> 8) & empty
+            doubles = ((singles & RANK_3) >> 8) & empty & checkMask
+            leftCaptures = ((pawns & ~FILE_A) >> 9) & enemies
+            rightCaptures = ((pawns & ~FILE_H) >> 7) & enemies
+        else:
+            step = 8
+            singles = (pawns << 8) & empty
+            doubles = ((singles & RANK_6) << 8) & empty & checkMask
+            leftCaptures = ((pawns & ~FILE_A) << 7) & enemies & FULL_BOARD
+            rightCaptures = ((pawns & ~FILE_H) << 9) & enemies & FULL_BOARD
+        singles &= checkMask
+        if not quiets: # only the pushes that promote go with the captures
+            singles &= BACK_RANKS
+            doubles = 0
+        if not captures:
+            singles &= ~BACK_RANKS
+            leftCaptures = rightCaptures = 0
+        self.addPawnTargets(singles, step, pinMasks, moves)
+        self.addPawnTargets(doubles, 2 * step, pinMasks, moves)
+        self.addPawnTargets(leftCaptures, step - 1, pinMasks, moves)
+        self.addPawnTargets(rightCaptures, step + 1, pinMasks, moves)
+
+        if captures and self.enPassantPossible != ():
+            epSq = squareIndex(*self.enPassantPossible)
+            attackers = PAWN_ATTACKS[enemyColor][epSq] & pawns # our pawns that attack the en-passant square
+            while attackers:
+                low = attackers & -attackers
+                attackers ^= low
+                sq = low.bit_length() - 1
+                if self.enPassantIsLegal(sq, epSq, step, allyColor, enemyColor, kingSq):
+                    moves.append(sq | epSq << 6 | EN_PASSANT_MOVE << 12)
+
+    def addPawnTargets(self, targets, offset, pinMasks, moves):
+        for startSq, pinMask in pinMasks.items(): # a pinned pawn keeps only the target along its pin
+            endSq = startSq + offset
+            if 0 <= endSq < 64 and not pinMask & (1 << endSq):
+                targets &= ~(1 << endSq)
+        promotions = targets & BACK_RANKS
+        targets ^= promotions
+        if targets: # the moves of a whole row of targets at once
+            row = bitScanForward(targets) >> 3
+            targets >>= row * 8
+            rowMoves = PAWN_ROW_MOVES[offset]
+            while targets:
+                if targets & 0xFF:
+                    moves.extend(rowMoves[row][targets & 0xFF])
+                targets >>= 8
+                row += 1
+        while promotions:
+            low = promotions & -promotions
+            promotions ^= low
+            endSq = low.bit_length() - 1
+            promotion = endSq - offset | endSq << 6 | PROMOTION_MOVE << 12
+            moves.extend((promotion, promotion | 1 << 14, promotion | 2 << 14, promotion | 3 << 14))
+
+    '''
+    An en-passant capture removes two pawns from the board at once, so it is checked by looking for sliders that hit
+    the king once both pawns are gone (this also covers pins and checks given by the captured pawn)
+    '''
+    def enPassantIsLegal(self, sq, epSq, step, allyColor, enemyColor, kingSq):
+        capturedSq = epSq - step
+        occupied = (self.occupied & ~(1 << sq) & ~(1 << capturedSq)) | (1 << epSq)
+        pb = self.pieceBoards
+        queens = pb[enemyColor + 'Q']
+        if rookAttacks(kingSq, occupied) & (pb[enemyColor + 'R'] | queens):
+            return False
+        if bishopAttacks(kingSq, occupied) & (pb[enemyColor + 'B'] | queens):
+            return False
+        # remaining checkers must be the captured pawn itself, or a knight/pawn that the capture does not address
+        others = (KNIGHT_ATTACKS[kingSq] & pb[enemyColor + 'N']) | \
+                 (PAWN_ATTACKS[allyColor][kingSq] & pb[enemyColor + 'P'] & ~(1 << capturedSq))
+        return others == 0
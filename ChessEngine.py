@@ -1,9 +1,92 @@
 """
 This class is responsible for storing all the information about the current state of a chess game. It will also be responsible for determining the valid moves at the current state. It will also keep a move log.
+The engine doesn't depend on pygame or the GUI modules, so it can be used on its own (batch jobs, perft, search).
 """
-import PawnPromotionMain
+import random
+import Evaluation
+from Evaluation import MG_SCORES, EG_SCORES, PHASES
+
+PROMOTION_PIECES = ('Q', 'R', 'B', 'N')
+
+# results of GameState.gameStatus
+STATUS_ONGOING = 'ongoing'
+STATUS_CHECKMATE = 'checkmate'
+STATUS_STALEMATE = 'stalemate'
+STATUS_INSUFFICIENT_MATERIAL = 'insufficient material'
+STATUS_FIFTY_MOVES = 'fifty-move rule'
+STATUS_REPETITION = 'threefold repetition'
+DRAW_STATUSES = (STATUS_STALEMATE, STATUS_INSUFFICIENT_MATERIAL, STATUS_FIFTY_MOVES, STATUS_REPETITION)
+FIFTY_MOVE_PLIES = 100 # halfmoveClock at which the game is drawn
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# Moves are generated and made as packed integers so the search doesn't build a Move object for every move:
+# start square | end square << 6 | flag << 12 | promotion piece << 14, with squares numbered row * 8 + col and the
+# promotion piece as an index in PROMOTION_PIECES. Move objects are only built at the API boundary (getValidMoves).
+NORMAL_MOVE = 0
+EN_PASSANT_MOVE = 1
+CASTLE_MOVE = 2
+PROMOTION_MOVE = 3
+SQUARES = [(r, c) for r in range(8) for c in range(8)] # (row, col) of every square number, shared to avoid new tuples
+
+def encodeMove(startSq, endSq, flag=NORMAL_MOVE, promotion=0):
+    return startSq | (endSq << 6) | (flag << 12) | (promotion << 14)
+
+'''
+Build the Move object of a packed move, board must be the position the move is played from
+'''
+def moveFromCode(code, board):
+    flag = (code >> 12) & 3
+    return Move(SQUARES[code & 63], SQUARES[(code >> 6) & 63], board, enPassant=flag == EN_PASSANT_MOVE,
+                isCastleMove=flag == CASTLE_MOVE, promotionChoice=PROMOTION_PIECES[code >> 14] if flag == PROMOTION_MOVE else None)
+
+# Squares reached from every square, used to keep the attack maps up to date. DIRECTIONS are in the same order as in
+# checkForPinsAndChecks: 0-3 orthogonal, 4-7 diagonal.
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+
+def squaresFrom(sq, offsets, slide):
+    r, c = SQUARES[sq]
+    squares = []
+    for dr, dc in offsets:
+        endRow, endCol = r + dr, c + dc
+        while 0 <= endRow < 8 and 0 <= endCol < 8:
+            squares.append(endRow * 8 + endCol)
+            if not slide:
+                break
+            endRow, endCol = endRow + dr, endCol + dc
+    return tuple(squares)
+
+RAYS = [[squaresFrom(sq, (d,), True) for d in DIRECTIONS] for sq in range(64)] # RAYS[sq][j]: squares from sq going in direction j
+KNIGHT_SQUARES = [squaresFrom(sq, ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)), False) for sq in range(64)]
+KING_SQUARES = [squaresFrom(sq, DIRECTIONS, False) for sq in range(64)]
+SLIDING_DIRECTIONS = {'R': range(4), 'B': range(4, 8), 'Q': range(8)}
+RAY_CELLS = [[tuple(SQUARES[target] for target in ray) for ray in rays] for rays in RAYS] # the same rays as (row, col)
+RAY_PAIRS = ((0, 2, ('R', 'Q')), (1, 3, ('R', 'Q')), (4, 7, ('B', 'Q')), (5, 6, ('B', 'Q'))) # opposite directions and the pieces sliding along them
+PAWN_ATTACK_SQUARES = {'w': [squaresFrom(sq, ((-1, -1), (-1, 1)), False) for sq in range(64)],
+                       'b': [squaresFrom(sq, ((1, -1), (1, 1)), False) for sq in range(64)]}
+
+# BETWEEN[a][b]: squares strictly between a and b, LINE[a][b]: every square of the row, column or diagonal through a and b.
+# Both are empty when a and b aren't on one line.
+BETWEEN = [[frozenset()] * 64 for _ in range(64)]
+LINE = [[frozenset()] * 64 for _ in range(64)]
+for a in range(64):
+    for j in range(8):
+        ray = RAYS[a][j]
+        line = frozenset(ray + RAYS[a][j ^ 2 if j < 4 else 7 - (j - 4)] + (a,)) # 0 <-> 2, 1 <-> 3, 4 <-> 7, 5 <-> 6
+        for i in range(len(ray)):
+            BETWEEN[a][ray[i]] = frozenset(ray[:i])
+            LINE[a][ray[i]] = line
+
+# Zobrist keys: one random 64-bit number per piece and square, castle right, en-passant file and side to move.
+# The hash of a position is the XOR of the keys of everything in it. The seed is fixed so keys are the same every run.
+zobristRandom = random.Random(20240917)
+ZOBRIST_PIECES = {color + piece: [zobristRandom.getrandbits(64) for _ in range(64)] for color in 'wb' for piece in 'PNBRQK'}
+ZOBRIST_CASTLE = [zobristRandom.getrandbits(64) for _ in range(4)] # wks, wqs, bks, bqs
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for _ in range(8)] # by column
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
 
 class GameState():
+    trackAttacks = False # keep attackMaps up to date in makeMoveCode/undoMoveCode instead of scanning the board (see AttackMapGameState)
+
     def __init__(self):
         # The board is an 8x8 2d list, each element of the list has 2 characters.
         # The first character represents the color of the piece, 'b' or 'w'
@@ -22,202 +105,800 @@ class GameState():
         self.moveFunctions = {'P': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves, 'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
         self.whiteToMove = True
         self.movelog = []
+        self.codeLog = [] # packed moves made, together with the piece each one captured
+        self.capturedLog = []
+        self.startFen = START_FEN # the position the moves of codeLog were played from
         self.whiteKingLocation = (7, 4)
         self.blackKingLocation = (0, 4)
         self.inCheck = False
         self.checks = []
         self.pins = []
+        self.pinLines = {} # square of every pinned piece: the squares it may still move to
         self.checkMate = False
         self.staleMate = False
+        self.statusKey = None # Zobrist key of the position the cached status belongs to
+        self.moveIndex = None # cached by getValidMoveIndex
+        self.status = STATUS_ONGOING
         self.enPassantPossible = () # square where en-passant capture can happen
+        self.enPassantLog = [self.enPassantPossible]
         self.whiteCastleKingside = True
         self.whiteCastleQueenside = True
         self.blackCastleKingside = True
         self.blackCastleQueenside = True
         self.castleRightsLog = [CastleRights(self.whiteCastleKingside, self.blackCastleKingside, self.whiteCastleQueenside, self.blackCastleQueenside)]
+        self.halfmoveClock = 0 # plies since the last capture or pawn move
+        self.halfmoveClockLog = []
+        self.fullmoveNumber = 1 # starts at 1 and goes up after every black move
+        self.promotionCallback = None # function returning 'Q', 'R', 'B' or 'N' for promotions built without a piece
+        self.debugIncremental = False # when True every makeMove/undoMove checks the Zobrist key, the evaluation scores and the attack maps against a full recomputation
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        self.mgScore, self.egScore, self.phase = Evaluation.scoreBoard(self.board) # kept up to date for Evaluation.evaluate
+        self.scoreLog = []
+        self.attackMaps = self.computeAttackMaps() if self.trackAttacks else None # {'w': [...], 'b': [...]} attackers of each square by color
+
+    '''
+    Create a game state (of this class, so subclasses get their own kind) set up from a FEN string
+    '''
+    @classmethod
+    def fromFEN(cls, fen):
+        gs = cls()
+        gs.loadFEN(fen)
+        return gs
+
+    '''
+    Set up the position from a FEN string: piece placement, side to move, castling, en-passant square and the move
+    counters (the last three fields are optional). The move log starts empty. Raises ValueError if the FEN is malformed
+    or has a pawn on the first or eighth rank. A castling right whose king or rook isn't on its home square is dropped.
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 2:
+            raise ValueError('FEN needs at least piece placement and side to move: ' + repr(fen))
+        board = []
+        kings = {}
+        for rank in fields[0].split('/'):
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend(['--'] * int(char))
+                elif char.upper() in 'PNBRQK':
+                    piece = ('w' if char.isupper() else 'b') + char.upper()
+                    if piece[1] == 'K':
+                        kings[piece] = (len(board), len(row))
+                    elif piece[1] == 'P' and len(board) in (0, 7):
+                        raise ValueError('pawn on the first or eighth rank in FEN: ' + repr(fen))
+                    row.append(piece)
+                else:
+                    raise ValueError('invalid piece ' + repr(char) + ' in FEN: ' + repr(fen))
+            if len(row) != 8:
+                raise ValueError('FEN rank does not have 8 squares: ' + repr(rank))
+            board.append(row)
+        if len(board) != 8:
+            raise ValueError('FEN does not have 8 ranks: ' + repr(fen))
+        if 'wK' not in kings or 'bK' not in kings:
+            raise ValueError('FEN needs a white and a black king: ' + repr(fen))
+        if fields[1] not in ('w', 'b'):
+            raise ValueError('invalid side to move in FEN: ' + repr(fields[1]))
+        castling = fields[2] if len(fields) > 2 else '-'
+        enPassant = fields[3] if len(fields) > 3 else '-'
+        if enPassant != '-' and (len(enPassant) != 2 or enPassant[0] not in Move.filesToCols or enPassant[1] not in ('3', '6')):
+            raise ValueError('invalid en-passant square in FEN: ' + repr(enPassant))
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError('invalid move counters in FEN: ' + repr(fen))
+
+        self.board = board
+        self.whiteKingLocation = kings['wK']
+        self.blackKingLocation = kings['bK']
+        self.whiteToMove = fields[1] == 'w'
+        self.whiteCastleKingside = 'K' in castling and board[7][4] == 'wK' and board[7][7] == 'wR'
+        self.whiteCastleQueenside = 'Q' in castling and board[7][4] == 'wK' and board[7][0] == 'wR'
+        self.blackCastleKingside = 'k' in castling and board[0][4] == 'bK' and board[0][7] == 'bR'
+        self.blackCastleQueenside = 'q' in castling and board[0][4] == 'bK' and board[0][0] == 'bR'
+        self.castleRightsLog = [CastleRights(self.whiteCastleKingside, self.blackCastleKingside, self.whiteCastleQueenside, self.blackCastleQueenside)]
+        if enPassant != '-':
+            self.enPassantPossible = (Move.ranksToRows[enPassant[1]], Move.filesToCols[enPassant[0]])
+        else:
+            self.enPassantPossible = ()
+        self.enPassantLog = [self.enPassantPossible]
+        self.halfmoveClock = halfmoveClock
+        self.halfmoveClockLog = []
+        self.fullmoveNumber = fullmoveNumber
+        self.movelog = []
+        self.codeLog = []
+        self.capturedLog = []
+        self.inCheck = False
+        self.checkMate = False
+        self.staleMate = False
+        self.statusKey = None
+        self.moveIndex = None
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = [self.zobristKey]
+        self.mgScore, self.egScore, self.phase = Evaluation.scoreBoard(self.board)
+        self.scoreLog = []
+        self.attackMaps = self.computeAttackMaps() if self.trackAttacks else None
+        self.startFen = self.toFEN() # with all six fields, even when some were left out
+
+    '''
+    FEN of the position the game started from and the packed moves played since, so the game can be rebuilt with its
+    history (for repetitions) on another thread or process, or written out
+    '''
+    def gameHistory(self):
+        return self.startFen, list(self.codeLog)
 
     '''
-    Takes a Move as a parameter and executes it (this will not work for castling, pawn promotion and en-passant)
+    FEN string of the current position
+    '''
+    def toFEN(self):
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for square in row:
+                if square == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += square[1] if square[0] == 'w' else square[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = ('K' if self.whiteCastleKingside else '') + ('Q' if self.whiteCastleQueenside else '') + \
+                   ('k' if self.blackCastleKingside else '') + ('q' if self.blackCastleQueenside else '')
+        if self.enPassantPossible:
+            enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]]
+        else:
+            enPassant = '-'
+        return ' '.join(('/'.join(ranks), 'w' if self.whiteToMove else 'b', castling or '-', enPassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
+
+    '''
+    Takes a Move as a parameter and executes it
     '''    
     def makeMove(self, move):
-        ps = PawnPromotionMain
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        # pawn promotion
+        if move.isPawnPromotion and move.promotionChoice is None: # a move built by hand without the piece to promote to
+            move.setPromotionChoice(self.promotionCallback() if self.promotionCallback is not None else 'Q')
+        self.makeMoveCode(move.code)
         self.movelog.append(move) # log the move so we can undo it later
+        
+    '''
+    Undo the last move
+    '''
+    def undoMove(self):
+        if len(self.movelog) != 0: # make sure that there is a move to undo
+            self.movelog.pop()
+            self.undoMoveCode()
+    
+    '''
+    Executes a packed move. Used directly by the search: it doesn't touch movelog, so every makeMoveCode must be paired
+    with undoMoveCode (not undoMove)
+    '''
+    def makeMoveCode(self, code):
+        board = self.board
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        flag = (code >> 12) & 3
+        startRow, startCol = SQUARES[startSq]
+        endRow, endCol = SQUARES[endSq]
+        pieceMoved = board[startRow][startCol]
+        if flag == EN_PASSANT_MOVE:
+            capturedRow = startRow
+            pieceCaptured = board[startRow][endCol]
+        else:
+            capturedRow = endRow
+            pieceCaptured = board[endRow][endCol]
+        
+        key = self.zobristKey ^ self.getEnPassantKey() ^ self.getCastleKey() ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[pieceMoved][startSq]
+        if pieceCaptured != '--':
+            key ^= ZOBRIST_PIECES[pieceCaptured][capturedRow * 8 + endCol]
+        
+        placedPiece = pieceMoved[0] + PROMOTION_PIECES[code >> 14] if flag == PROMOTION_MOVE else pieceMoved
+        
+        # evaluation scores
+        self.scoreLog.append((self.mgScore, self.egScore, self.phase))
+        mgScore = self.mgScore - MG_SCORES[pieceMoved][startSq] + MG_SCORES[placedPiece][endSq]
+        egScore = self.egScore - EG_SCORES[pieceMoved][startSq] + EG_SCORES[placedPiece][endSq]
+        phase = self.phase + PHASES[placedPiece] - PHASES[pieceMoved] # a promotion adds the new piece's phase
+        if pieceCaptured != '--':
+            mgScore -= MG_SCORES[pieceCaptured][capturedRow * 8 + endCol]
+            egScore -= EG_SCORES[pieceCaptured][capturedRow * 8 + endCol]
+            phase -= PHASES[pieceCaptured]
+        
+        if self.attackMaps is not None: # same board changes, one square at a time so the attack maps follow
+            self.removePiece(startSq)
+            if flag == EN_PASSANT_MOVE:
+                self.removePiece(capturedRow * 8 + endCol)
+                self.placePiece(endSq, placedPiece)
+            elif pieceCaptured != '--':
+                self.replacePiece(endSq, placedPiece)
+            else:
+                self.placePiece(endSq, placedPiece)
+        else:
+            board[startRow][startCol] = "--"
+            board[capturedRow][endCol] = "--" # if en-passant move, must update the board to capture the pawn
+            board[endRow][endCol] = placedPiece
+        self.codeLog.append(code) # log the move so we can undo it later
+        self.capturedLog.append(pieceCaptured)
         self.whiteToMove = not self.whiteToMove # swap players
         
+        # move counters
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if pieceMoved[1] == 'P' or pieceCaptured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if pieceMoved[0] == 'b':
+            self.fullmoveNumber += 1
+        
         # update the king's location if moved
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
-            
-        # pawn promotion
-        if move.isPawnPromotion:
-            promotedPiece = ps.main()
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece
+        if pieceMoved == 'wK':
+            self.whiteKingLocation = SQUARES[endSq]
+        elif pieceMoved == 'bK':
+            self.blackKingLocation = SQUARES[endSq]
         
         # if pawn moves twice, next move can capture en-passant
-        if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-            self.enPassantPossible = ((move.endRow + move.startRow)//2, move.endCol)
+        if pieceMoved[1] == 'P' and abs(startRow - endRow) == 2:
+            self.enPassantPossible = SQUARES[(startSq + endSq) // 2]
         else:
             self.enPassantPossible = ()
-        
-        # if en-passant move, must update the board to capture the pawn
-        if move.enPassant:
-            self.board[move.startRow][move.endCol] = "--"
+        self.enPassantLog.append(self.enPassantPossible)
             
         # castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2: # king side castle
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] # moves the rook
-                self.board[move.endRow][move.endCol+1] = '--'
+        if flag == CASTLE_MOVE:
+            rook = pieceMoved[0] + 'R'
+            rookKeys = ZOBRIST_PIECES[rook]
+            if endCol - startCol == 2: # king side castle
+                rookStart, rookEnd = endSq + 1, endSq - 1
             else: # queen side castle
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2] # moves the rook
-                self.board[move.endRow][move.endCol-2] = '--'
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            if self.attackMaps is not None:
+                self.removePiece(rookStart)
+                self.placePiece(rookEnd, rook)
+            else:
+                board[endRow][rookEnd & 7] = rook # moves the rook
+                board[endRow][rookStart & 7] = '--'
+            key ^= rookKeys[rookStart] ^ rookKeys[rookEnd]
+            mgScore += MG_SCORES[rook][rookEnd] - MG_SCORES[rook][rookStart]
+            egScore += EG_SCORES[rook][rookEnd] - EG_SCORES[rook][rookStart]
+        self.mgScore = mgScore
+        self.egScore = egScore
+        self.phase = phase
             
-        # update castling rights - whenever it is a rook or a king move
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.whiteCastleKingside, self.blackCastleKingside, self.whiteCastleQueenside, self.blackCastleQueenside))      
+        # update castling rights - whenever it is a rook or a king move, a new CastleRights is only needed if they changed
+        lastRights = self.castleRightsLog[-1]
+        self.updateCastleRights(pieceMoved, startRow, startCol, pieceCaptured, endRow, endCol)
+        if self.whiteCastleKingside == lastRights.wks and self.whiteCastleQueenside == lastRights.wqs and \
+                self.blackCastleKingside == lastRights.bks and self.blackCastleQueenside == lastRights.bqs:
+            self.castleRightsLog.append(lastRights)
+        else:
+            self.castleRightsLog.append(CastleRights(self.whiteCastleKingside, self.blackCastleKingside, self.whiteCastleQueenside, self.blackCastleQueenside))      
         
+        # the piece on the end square is the promoted piece for promotions
+        key ^= ZOBRIST_PIECES[board[endRow][endCol]][endSq]
+        self.zobristKey = key ^ self.getEnPassantKey() ^ self.getCastleKey()
+        self.zobristLog.append(self.zobristKey)
+        if self.debugIncremental:
+            self.checkIncrementalState('makeMove ' + moveNotation(code))
+    
     '''
-    Undo the last move
+    Undo the last packed move
     '''
-    def undoMove(self):
-        if len(self.movelog) != 0: # make sure that there is a move to undo
-            move = self.movelog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
-            self.whiteToMove = not self.whiteToMove # Switch turns back
-            
-            # update the king's position if needed
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
-            
-            # undo en-passant is different
-            if move.enPassant:
-                self.board[move.endRow][move.endCol] = '--' # removes the pawn that was added in the wrong square
-                self.board[move.startRow][move.endCol] = move.pieceCaptured # puts the pawn back on the correct square it was captured from
-                self.enPassantPossible = (move.endRow, move.endCol) # allow an en-passant to happen on the next move
-            
-            # undo a 2 square pawn advance should make enPassantPossible = () again
-            if move.pieceMoved[1] == "P" and abs(move.startRow - move.endRow) == 2:
-                self.enPassantPossible = ()
-            
-            # undo castling rights
-            self.castleRightsLog.pop() # get rid of the new castle rights from the move we are undoing
-            castleRights = self.castleRightsLog[-1] # set the current castle rights to the last one in the list
-            self.whiteCastleKingside = castleRights.wks
-            self.whiteCastleQueenside = castleRights.wqs
-            self.blackCastleKingside = castleRights.bks
-            self.blackCastleQueenside = castleRights.bqs
-            
+    def undoMoveCode(self):
+        if len(self.codeLog) == 0:
+            return
+        board = self.board
+        code = self.codeLog.pop()
+        pieceCaptured = self.capturedLog.pop()
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        flag = (code >> 12) & 3
+        startRow, startCol = SQUARES[startSq]
+        endRow, endCol = SQUARES[endSq]
+        pieceMoved = board[endRow][endCol]
+        if flag == PROMOTION_MOVE:
+            pieceMoved = pieceMoved[0] + 'P'
+        if self.attackMaps is not None: # the board changes of makeMoveCode taken back in reverse order
+            if flag == CASTLE_MOVE:
+                rook = pieceMoved[0] + 'R'
+                if endCol - startCol == 2: # kingside
+                    self.removePiece(endSq - 1)
+                    self.placePiece(endSq + 1, rook)
+                else: # queenside
+                    self.removePiece(endSq + 1)
+                    self.placePiece(endSq - 2, rook)
+            if flag == EN_PASSANT_MOVE:
+                self.removePiece(endSq)
+                self.placePiece(startRow * 8 + endCol, pieceCaptured)
+            elif pieceCaptured != '--':
+                self.replacePiece(endSq, pieceCaptured)
+            else:
+                self.removePiece(endSq)
+            self.placePiece(startSq, pieceMoved)
+        else:
+            board[startRow][startCol] = pieceMoved
+            if flag == EN_PASSANT_MOVE:
+                board[endRow][endCol] = '--' # removes the pawn that was added in the wrong square
+                board[startRow][endCol] = pieceCaptured # puts the pawn back on the correct square it was captured from
+            else:
+                board[endRow][endCol] = pieceCaptured
             # undo castle moves
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2: # kingside
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                    self.board[move.endRow][move.endCol-1] = '--'
+            if flag == CASTLE_MOVE:
+                if endCol - startCol == 2: # kingside
+                    board[endRow][endCol+1] = board[endRow][endCol-1]
+                    board[endRow][endCol-1] = '--'
                 else: #queenside
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
-                    self.board[move.endRow][move.endCol+1] = '--'   
+                    board[endRow][endCol-2] = board[endRow][endCol+1]
+                    board[endRow][endCol+1] = '--'
+        self.whiteToMove = not self.whiteToMove # Switch turns back
+        
+        # undo the move counters
+        self.halfmoveClock = self.halfmoveClockLog.pop()
+        if pieceMoved[0] == 'b':
+            self.fullmoveNumber -= 1
+        
+        # update the king's position if needed
+        if pieceMoved == 'wK':
+            self.whiteKingLocation = SQUARES[startSq]
+        elif pieceMoved == 'bK':
+            self.blackKingLocation = SQUARES[startSq]
+        
+        # undo en-passant rights
+        self.enPassantLog.pop()
+        self.enPassantPossible = self.enPassantLog[-1]
+        
+        # undo the position key and the evaluation scores
+        self.zobristLog.pop()
+        self.zobristKey = self.zobristLog[-1]
+        self.mgScore, self.egScore, self.phase = self.scoreLog.pop()
+        
+        # undo castling rights
+        self.castleRightsLog.pop() # get rid of the new castle rights from the move we are undoing
+        castleRights = self.castleRightsLog[-1] # set the current castle rights to the last one in the list
+        self.whiteCastleKingside = castleRights.wks
+        self.whiteCastleQueenside = castleRights.wqs
+        self.blackCastleKingside = castleRights.bks
+        self.blackCastleQueenside = castleRights.bqs
+        
+        if self.debugIncremental:
+            self.checkIncrementalState('undoMove ' + moveNotation(code))
+    
+    '''
+    Zobrist key of the castle rights that are currently available
+    '''
+    def getCastleKey(self):
+        key = 0
+        if self.whiteCastleKingside:
+            key ^= ZOBRIST_CASTLE[0]
+        if self.whiteCastleQueenside:
+            key ^= ZOBRIST_CASTLE[1]
+        if self.blackCastleKingside:
+            key ^= ZOBRIST_CASTLE[2]
+        if self.blackCastleQueenside:
+            key ^= ZOBRIST_CASTLE[3]
+        return key
     
     '''
-    Update the castle rights given the move
+    Zobrist key of the en-passant square, only counted when a pawn of the side to move stands next to the pawn that
+    just moved two squares, so positions that only differ by an unusable en-passant square get the same key
     '''
-    def updateCastleRights(self, move):
-        if move.pieceMoved == 'wK':
+    def getEnPassantKey(self):
+        if self.enPassantPossible == ():
+            return 0
+        r, c = self.enPassantPossible
+        pawnRow = r + 1 if self.whiteToMove else r - 1 # row of the pawn that just moved two squares
+        allyPawn = 'wP' if self.whiteToMove else 'bP'
+        if (c > 0 and self.board[pawnRow][c - 1] == allyPawn) or (c < 7 and self.board[pawnRow][c + 1] == allyPawn):
+            return ZOBRIST_EN_PASSANT[c]
+        return 0
+    
+    '''
+    Compute the Zobrist key of the current position from scratch
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '--':
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ self.getCastleKey() ^ self.getEnPassantKey()
+    
+    '''
+    Compare the state kept up to date move by move (Zobrist key, evaluation scores, attack maps) with a full
+    recomputation
+    '''
+    def checkIncrementalState(self, context):
+        expected = self.computeZobristKey()
+        if self.zobristKey != expected:
+            raise RuntimeError('Zobrist key out of sync after ' + context + ': ' + hex(self.zobristKey) + ' != ' + hex(expected))
+        expected = Evaluation.scoreBoard(self.board)
+        if (self.mgScore, self.egScore, self.phase) != expected:
+            raise RuntimeError('evaluation scores out of sync after ' + context + ': ' + str((self.mgScore, self.egScore, self.phase)) + ' != ' + str(expected))
+        if self.attackMaps is not None and self.attackMaps != self.computeAttackMaps():
+            raise RuntimeError('attack maps out of sync after ' + context)
+    
+    '''
+    Update the castle rights given the piece that moved and the piece it captured
+    '''
+    def updateCastleRights(self, pieceMoved, startRow, startCol, pieceCaptured, endRow, endCol):
+        if pieceMoved == 'wK':
             self.whiteCastleKingside = False
             self.whiteCastleQueenside = False
-        elif move.pieceMoved == 'bK':
+        elif pieceMoved == 'bK':
             self.blackCastleKingside = False
             self.blackCastleQueenside = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0: # left rook
+        elif pieceMoved == 'wR':
+            if startRow == 7:
+                if startCol == 0: # left rook
                     self.whiteCastleQueenside = False
-                elif move.startCol == 7: # right rook
+                elif startCol == 7: # right rook
                     self.whiteCastleKingside = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 7:
-                if move.startCol == 0: # left rook
+        elif pieceMoved == 'bR':
+            if startRow == 0:
+                if startCol == 0: # left rook
                     self.blackCastleQueenside = False
-                elif move.startCol == 7: # right rook
-                    self.blackCastleKingside = False   
+                elif startCol == 7: # right rook
+                    self.blackCastleKingside = False
+        
+        # a captured rook can't castle anymore either
+        if pieceCaptured == 'wR':
+            if endRow == 7:
+                if endCol == 0:
+                    self.whiteCastleQueenside = False
+                elif endCol == 7:
+                    self.whiteCastleKingside = False
+        elif pieceCaptured == 'bR':
+            if endRow == 0:
+                if endCol == 0:
+                    self.blackCastleQueenside = False
+                elif endCol == 7:
+                    self.blackCastleKingside = False
     
+    '''
+    Count the attackers of every square for both colors from scratch
+    '''
+    def computeAttackMaps(self):
+        attackMaps = {'w': [0] * 64, 'b': [0] * 64}
+        for sq in range(64):
+            piece = self.board[sq >> 3][sq & 7]
+            if piece != '--':
+                counts = attackMaps[piece[0]]
+                for target in self.attackedSquares(piece, sq):
+                    counts[target] += 1
+        return attackMaps
+
+    '''
+    Squares attacked by piece standing on sq, sliding pieces stop at the first piece in each direction (included)
+    '''
+    def attackedSquares(self, piece, sq):
+        type = piece[1]
+        if type == 'P':
+            return PAWN_ATTACK_SQUARES[piece[0]][sq]
+        if type == 'N':
+            return KNIGHT_SQUARES[sq]
+        if type == 'K':
+            return KING_SQUARES[sq]
+        board = self.board
+        squares = []
+        for j in SLIDING_DIRECTIONS[type]:
+            for target in RAYS[sq][j]:
+                squares.append(target)
+                if board[target >> 3][target & 7] != '--':
+                    break
+        return squares
+
+    '''
+    A square becomes empty or occupied: sliding pieces that reach sq now attack further (delta 1) or get blocked (delta -1)
+    '''
+    def updateSlidingRays(self, sq, delta):
+        board = self.board
+        rays = RAYS[sq]
+        cells = RAY_CELLS[sq]
+        for forward, backward, sliders in RAY_PAIRS:
+            # first piece in each of the two opposite directions, and the squares up to it
+            forwardPiece = '--'
+            forwardCount = len(cells[forward])
+            for i, (r, c) in enumerate(cells[forward]):
+                if board[r][c] != '--':
+                    forwardPiece = board[r][c]
+                    forwardCount = i + 1
+                    break
+            backwardPiece = '--'
+            backwardCount = len(cells[backward])
+            for i, (r, c) in enumerate(cells[backward]):
+                if board[r][c] != '--':
+                    backwardPiece = board[r][c]
+                    backwardCount = i + 1
+                    break
+            if backwardPiece[1] in sliders: # it looks through sq along forward
+                counts = self.attackMaps[backwardPiece[0]]
+                for target in rays[forward][:forwardCount]:
+                    counts[target] += delta
+            if forwardPiece[1] in sliders:
+                counts = self.attackMaps[forwardPiece[0]]
+                for target in rays[backward][:backwardCount]:
+                    counts[target] += delta
+
+    def removePiece(self, sq):
+        board = self.board
+        piece = board[sq >> 3][sq & 7]
+        counts = self.attackMaps[piece[0]]
+        for target in self.attackedSquares(piece, sq):
+            counts[target] -= 1
+        board[sq >> 3][sq & 7] = '--'
+        self.updateSlidingRays(sq, 1)
+
+    def placePiece(self, sq, piece):
+        self.updateSlidingRays(sq, -1)
+        self.board[sq >> 3][sq & 7] = piece
+        counts = self.attackMaps[piece[0]]
+        for target in self.attackedSquares(piece, sq):
+            counts[target] += 1
+
+    '''
+    Capture on sq: the square stays occupied, so only the attacks of the two pieces change
+    '''
+    def replacePiece(self, sq, piece):
+        board = self.board
+        captured = board[sq >> 3][sq & 7]
+        counts = self.attackMaps[captured[0]]
+        for target in self.attackedSquares(captured, sq):
+            counts[target] -= 1
+        board[sq >> 3][sq & 7] = piece
+        counts = self.attackMaps[piece[0]]
+        for target in self.attackedSquares(piece, sq):
+            counts[target] += 1
+
     '''
     All moves considering checks
     '''
     def getValidMoves(self):
-        # tempCastleRights = CastleRights(self.currentCastleRight.wks, self.currentCastleRight.bks,
-                                        # self.currentCastleRight.wqs, self.currentCastleRight.bqs) # copy the current castle rights
+        return [moveFromCode(code, self.board) for code in self.getValidMoveCodes()]
+    
+    '''
+    All moves considering checks, as packed moves
+    '''
+    def getValidMoveCodes(self):
+        moves = self.generateMoves([], True, True)
+        self.setStatus(len(moves) > 0)
+        return moves
+    
+    '''
+    The valid moves of the current position as a MoveIndex, built once per position (GUI clicks and highlights look
+    moves up in it every frame)
+    '''
+    def getValidMoveIndex(self):
+        if self.moveIndex is None or self.moveIndex.key != self.zobristKey:
+            self.moveIndex = MoveIndex(self.getValidMoves(), self.zobristKey)
+        return self.moveIndex
+    
+    '''
+    Game status of the current position: STATUS_CHECKMATE, STATUS_ONGOING or one of the DRAW_STATUSES. The part that only
+    depends on the position (mate, stalemate, insufficient material) is cached by Zobrist key, so asking again (every
+    frame, or after getValidMoves) is free; the fifty-move rule and repetitions depend on the move log and are checked
+    on every call, they only look back to the last capture or pawn move.
+    '''
+    def gameStatus(self):
+        if self.statusKey != self.zobristKey:
+            self.setStatus(self.hasLegalMove())
+        if self.status == STATUS_ONGOING:
+            if self.halfmoveClock >= FIFTY_MOVE_PLIES:
+                return STATUS_FIFTY_MOVES
+            if self.repetitions() >= 2:
+                return STATUS_REPETITION
+        return self.status
+    
+    def isCheckmate(self):
+        return self.gameStatus() == STATUS_CHECKMATE
+    
+    def isStalemate(self):
+        return self.gameStatus() == STATUS_STALEMATE
+    
+    def isDraw(self):
+        return self.gameStatus() in DRAW_STATUSES
+    
+    '''
+    Cache the status of the current position given whether the side to move has a legal move (inCheck must be up to
+    date), and keep the checkMate and staleMate flags in line with it. staleMate is also set when neither side can mate,
+    the search scores both the same way.
+    '''
+    def setStatus(self, hasLegalMove):
+        if not hasLegalMove:
+            self.status = STATUS_CHECKMATE if self.inCheck else STATUS_STALEMATE
+        elif self.isInsufficientMaterial():
+            self.status = STATUS_INSUFFICIENT_MATERIAL
+        else:
+            self.status = STATUS_ONGOING
+        self.statusKey = self.zobristKey
+        self.checkMate = self.status == STATUS_CHECKMATE
+        self.staleMate = self.status in (STATUS_STALEMATE, STATUS_INSUFFICIENT_MATERIAL)
+    
+    '''
+    Whether neither side can ever checkmate: only kings, a single knight, or any number of bishops (of either side) all
+    on squares of the same color. The scan stops at the first pawn, rook or queen, so it's short unless few pieces are
+    left.
+    '''
+    def isInsufficientMaterial(self):
+        knights = 0
+        bishopColors = set() # square colors the bishops stand on
+        for r in range(8):
+            row = self.board[r]
+            for c in range(8):
+                type = row[c][1]
+                if type == 'P' or type == 'R' or type == 'Q':
+                    return False
+                if type == 'N':
+                    knights += 1
+                elif type == 'B':
+                    bishopColors.add((r + c) % 2)
+        if knights == 0:
+            return len(bishopColors) <= 1
+        return knights == 1 and len(bishopColors) == 0
+    
+    '''
+    How many times the current position was reached before with the same side to move. Only positions since the last
+    capture or pawn move (halfmoveClock plies back) can be the same, so that's as far as the Zobrist keys are compared.
+    '''
+    def repetitions(self):
+        log = self.zobristLog
+        key = self.zobristKey
+        last = len(log) - 1
+        count = 0
+        for i in range(last - 4, max(last - self.halfmoveClock, 0) - 1, -2):
+            if log[i] == key:
+                count += 1
+        return count
+    
+    '''
+    Standard algebraic notation of a legal packed move in the current position (e4, Nbd7, exd6, O-O, e8=Q+, Qh4#), as
+    used in PGN. legalMoves are the valid move codes of the position when the caller already has them, a piece move
+    needs them to tell apart other pieces of the same kind that can go to the same square.
+    '''
+    def sanNotation(self, code, legalMoves=None):
+        startSq = code & 63
+        endSq = (code >> 6) & 63
+        flag = (code >> 12) & 3
+        startRow, startCol = SQUARES[startSq]
+        endRow, endCol = SQUARES[endSq]
+        pieceMoved = self.board[startRow][startCol]
+        capture = self.board[endRow][endCol] != '--' or flag == EN_PASSANT_MOVE
+        target = Move.colsToFiles[endCol] + Move.rowsToRanks[endRow]
+        if flag == CASTLE_MOVE:
+            san = 'O-O' if endCol > startCol else 'O-O-O'
+        elif pieceMoved[1] == 'P':
+            san = (Move.colsToFiles[startCol] + 'x' if capture else '') + target
+            if flag == PROMOTION_MOVE:
+                san += '=' + PROMOTION_PIECES[code >> 14]
+        else:
+            if legalMoves is None:
+                legalMoves = self.getValidMoveCodes()
+            others = [SQUARES[move & 63] for move in legalMoves if (move >> 6) & 63 == endSq and move & 63 != startSq
+                      and self.board[SQUARES[move & 63][0]][SQUARES[move & 63][1]] == pieceMoved]
+            origin = ''
+            if others:
+                if all(col != startCol for row, col in others):
+                    origin = Move.colsToFiles[startCol]
+                elif all(row != startRow for row, col in others):
+                    origin = Move.rowsToRanks[startRow]
+                else:
+                    origin = Move.colsToFiles[startCol] + Move.rowsToRanks[startRow]
+            san = pieceMoved[1] + origin + ('x' if capture else '') + target
+        self.makeMoveCode(code)
+        if not self.hasLegalMove(): # also sets inCheck for the side that has to reply
+            san += '#' if self.inCheck else ''
+        elif self.inCheck:
+            san += '+'
+        self.undoMoveCode()
+        return san
+    
+    '''
+    Whether the side to move has at least one legal move, stopping at the first one found. Sets inCheck.
+    '''
+    def hasLegalMove(self):
+        self.updatePinsAndChecks()
+        if self.whiteToMove:
+            kingRow, kingCol = self.whiteKingLocation
+            allyColor = 'w'
+        else:
+            kingRow, kingCol = self.blackKingLocation
+            allyColor = 'b'
         moves = []
-        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        self.getKingMoves(kingRow, kingCol, moves)
+        if len(moves) > 0:
+            return True
+        if len(self.checks) > 1: # double check, only the king could have moved
+            return False
+        validSquares = None
+        if self.inCheck:
+            checkSq = self.checks[0][0] * 8 + self.checks[0][1]
+            validSquares = BETWEEN[kingRow * 8 + kingCol][checkSq] | {checkSq}
+        for r in range(8):
+            row = self.board[r]
+            for c in range(8):
+                if row[c][0] == allyColor and row[c][1] != 'K':
+                    self.moveFunctions[row[c][1]](r, c, moves)
+                    for move in moves:
+                        if validSquares is None or ((move >> 6) & 63) in validSquares or (move >> 12) & 3 == EN_PASSANT_MOVE:
+                            return True
+                    del moves[:]
+        return False
+    
+    '''
+    Staged move generation: the legal captures (with en-passant and every promotion, captures or not) or the legal quiet
+    moves (with castling) of the side to move, so a search can stop after the captures without generating the rest.
+    moves is a buffer owned by the caller, it is emptied and filled. Unlike getValidMoveCodes these don't update
+    checkMate/staleMate, only inCheck.
+    '''
+    def generateCaptures(self, moves):
+        return self.generateMoves(moves, True, False)
+    
+    def generateQuiets(self, moves):
+        return self.generateMoves(moves, False, True)
+    
+    '''
+    Every legal move, for when the side to move is in check: the moves are then the evasions (king moves, capturing the
+    checking piece or blocking it) and there are too few of them to be worth generating in stages
+    '''
+    def generateEvasions(self, moves):
+        return self.generateMoves(moves, True, True)
+    
+    '''
+    Fill moves with the legal captures and/or quiet moves of the side to move, returns moves
+    '''
+    def generateMoves(self, moves, captures, quiets):
+        del moves[:]
+        self.updatePinsAndChecks()
         if self.whiteToMove:
             kingRow = self.whiteKingLocation[0]
             kingCol = self.whiteKingLocation[1]
-            # self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
         else:
             kingRow = self.blackKingLocation[0]
             kingCol = self.blackKingLocation[1]
-            # self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
         
         if self.inCheck:
             if len(self.checks) == 1: # only 1 check, block check or move king
-                moves = self.getAllPossibleMoves()
-                # to block a check you must move a piece into one of the squares between the enemy piece and king
+                self.getAllPossibleMoves(moves, captures, quiets)
+                # to block a check you must move a piece into one of the squares between the enemy piece and king,
+                # a knight or pawn check isn't on a line with the king so it can only be captured
                 check = self.checks[0] # check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol] # enemy piece causing the check
-                validSquares = [] # squares that pieces can move to
-                # if knight, must capture knight or move king, other pieces can be blocked
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) # check[2] and check[3] are the check direction
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: # once you get to piece and checks
-                            break
-                # get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1): # go through backwards when you are removing from a list as iterating
-                    if moves[i].pieceMoved[1] != 'K': # move doesn't move king so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares: # move doesn't block checks or capture piece
-                            moves.remove(moves[i])
+                checkSq = check[0] * 8 + check[1]
+                validSquares = BETWEEN[kingRow * 8 + kingCol][checkSq] | {checkSq} # squares that pieces can move to
+                board = self.board
+                # get rid of any moves that don't block check or move king (en-passant legality is checked when it is generated)
+                moves[:] = [move for move in moves if ((move >> 6) & 63) in validSquares or (move >> 12) & 3 == EN_PASSANT_MOVE or
+                            board[(move & 63) >> 3][move & 7][1] == 'K']
             else: # double check, king has to move
-                self.getKingMoves(kingRow, kingCol, moves)
+                self.getKingMoves(kingRow, kingCol, moves, captures, quiets)
         else: # not in check so all moves are fine
-            moves = self.getAllPossibleMoves()
-            
-        if len(moves) == 0:
-            if self.inCheck:
-                self.checkMate = True
-            else:
-                self.staleMate = True
-        else:
-            self.checkMate = False
-            self.staleMate = False
-            
-        count = 0
-        for i in self.board:
-            for j in i:
-                if j == '--':
-                    count += 1
-        if count == 62:
-            self.staleMate = True
-                    
+            self.getAllPossibleMoves(moves, captures, quiets)
         return moves
     
     '''
-    Determine if the current player is in check
+    Set inCheck, pins and checks for the side to move, and the line each pinned piece is still allowed to move on
+    '''
+    def updatePinsAndChecks(self):
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        self.pinLines = {pin[0] * 8 + pin[1]: LINE[kingRow * 8 + kingCol][pin[0] * 8 + pin[1]] for pin in self.pins}
+    
+    '''
+    Determine if the current player is in check, sets inCheck without generating any moves
     '''
-    def inCheck(self):
+    def kingInCheck(self):
         if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1], 'w')
+            self.inCheck = self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1], 'w')
         else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1], 'b')
+            self.inCheck = self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1], 'b')
+        return self.inCheck
         
     '''
     Returns if the player is in check, a list of pins, and a list of checks
@@ -238,106 +919,95 @@ class GameState():
             startCol = self.blackKingLocation[1]
         
         # check outward from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+        board = self.board
+        kingSq = startRow * 8 + startCol
+        rays = RAY_CELLS[kingSq]
+        for j in range(8):
+            d = DIRECTIONS[j]
             possiblePin = () # reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K':
-                        if possiblePin == (): # 1st allied piece could be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else: #2nd allied piece, so no pin or check possible in this direction
+            i = 0
+            for endRow, endCol in rays[j]: # the ray stops at the edge of the board
+                i += 1
+                endPiece = board[endRow][endCol]
+                if endPiece[0] == allyColor and endPiece[1] != 'K':
+                    if possiblePin == (): # 1st allied piece could be pinned
+                        possiblePin = (endRow, endCol, d[0], d[1])
+                    else: #2nd allied piece, so no pin or check possible in this direction
+                        break
+                elif endPiece[0] == enemyColor:
+                    type = endPiece[1]
+                    # 5 possibilities here in this complex conditional
+                    # 1.) orthogonally away from king and piece is a rook
+                    # 2.) diagonally away from king and piece is a bishop
+                    # 3.) 1 square away diagonally from king and piece is a pawn
+                    # 4.) any direction and piece is a queen
+                    # 5.) any direction 1 square away and piece is a king(this is necessary to prevent a king move to a square controlled by another king)
+                    if (0 <= j <=3 and type == 'R') or \
+                            (4 <= j <= 7 and type == 'B') or \
+                            (i == 1 and type == 'P' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
+                            (type == 'Q') or (i == 1 and type == 'K'):
+                        if possiblePin == (): # no piece blocking, so check
+                            inCheck = True
+                            checks.append((endRow, endCol, d[0], d[1]))
                             break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        # 5 possibilities here in this complex conditional
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king(this is necessary to prevent a king move to a square controlled by another king)
-                        if (0 <= j <=3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'P' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == (): # no piece blocking, so check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else: # piece blocking so pin
-                                pins.append(possiblePin)
-                                break
-                        else: # enemy piece not applying check
+                        else: # piece blocking so pin
+                            pins.append(possiblePin)
                             break
-                else: # off board
-                    break
+                    else: # enemy piece not applying check
+                        break
         
         # check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N': # enemy knight attacking king
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        for endSq in KNIGHT_SQUARES[kingSq]:
+            endRow, endCol = SQUARES[endSq]
+            if board[endRow][endCol] == enemyColor + 'N': # enemy knight attacking king
+                inCheck = True
+                checks.append((endRow, endCol, endRow - startRow, endCol - startCol))
         return inCheck, pins, checks
                                             
     '''
     Determine if the enemy can attack square r, c
     '''
     def squareUnderAttack(self, r, c, allyColor):
-        # check outward from square
         enemyColor = 'w' if allyColor == 'b' else 'b'
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            for i in range(1, 8):
-                endRow = r + d[0]*i
-                endCol = c + d[1]*i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor:
-                        break
-                    elif endPiece[0] == enemyColor:
-                        type = endPiece[1]
-                        if (0 <= j <=3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'P' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            return True
-                        else: # enemy piece not applying check
-                            break
-                else: # off board
+        if self.attackMaps is not None:
+            return self.attackMaps[enemyColor][r*8 + c] > 0
+        # check outward from square
+        board = self.board
+        rays = RAY_CELLS[r*8 + c]
+        for j in range(8):
+            i = 0
+            for endRow, endCol in rays[j]:
+                i += 1
+                endPiece = board[endRow][endCol]
+                if endPiece[0] == allyColor:
                     break
+                elif endPiece[0] == enemyColor:
+                    type = endPiece[1]
+                    if (0 <= j <=3 and type == 'R') or \
+                            (4 <= j <= 7 and type == 'B') or \
+                            (i == 1 and type == 'P' and ((enemyColor == 'w' and 6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
+                            (type == 'Q') or (i == 1 and type == 'K'):
+                        return True
+                    else: # enemy piece not applying check
+                        break
                 
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == 'N': # enemy knight attacking king
-                    return True
+        for endSq in KNIGHT_SQUARES[r*8 + c]:
+            if board[endSq >> 3][endSq & 7] == enemyColor + 'N': # enemy knight attacking king
+                return True
         return False
     
     '''
     All moves without considering checks
     '''
-    def getAllPossibleMoves(self):
-        # moves = [Move((6, 0), (4, 0), self.board)]
-        moves = []
+    def getAllPossibleMoves(self, moves=None, captures=True, quiets=True):
+        if moves is None:
+            moves = []
         for r in range(len(self.board)): # number of rows
             for c in range(len(self.board[r])): # number of cols in given row
                 turn = self.board[r][c][0]
                 if (turn == "w" and self.whiteToMove) or (turn == "b" and not self.whiteToMove):
                     piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves) # calls the appropriate move function based on piece type
+                    self.moveFunctions[piece](r, c, moves, captures, quiets) # calls the appropriate move function based on piece type
                     # print(moves)
         return moves
     
@@ -345,16 +1015,8 @@ class GameState():
     '''
     Get all the pawn moves for the pawn located at row, col and add these moves to the list
     '''
-    def getPawnMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+    def getPawnMoves(self, r, c, moves, captures=True, quiets=True):
+        pinLine = self.pinLines.get(r*8 + c) # squares the piece may move to when pinned
         
         if self.whiteToMove:
             moveAmount = -1
@@ -368,150 +1030,118 @@ class GameState():
             enemyColor = 'w'
           
         if self.board[r+moveAmount][c] == '--': # 1 square move
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                if r+moveAmount == backRow: # if piece gets to back rank it is a pawn promotion
-                    pawnPromotion = True
-                moves.append(Move((r, c), (r+moveAmount, c), self.board, pawnPromotion=True))
-                if r == startRow and self.board[r+2*moveAmount][c] == '--': # 2 square moves
-                    moves.append(Move((r, c), (r+2*moveAmount, c), self.board))
+            if pinLine is None or (r+moveAmount)*8 + c in pinLine:
+                if r+moveAmount == backRow:
+                    if captures: # promotions go with the captures
+                        self.addPawnMove(r, c, r+moveAmount, c, backRow, moves)
+                elif quiets:
+                    moves.append(r*8 + c | ((r+moveAmount)*8 + c) << 6)
+                    if r == startRow and self.board[r+2*moveAmount][c] == '--': # 2 square moves
+                        moves.append(r*8 + c | ((r+2*moveAmount)*8 + c) << 6)
         
-        if c-1 >= 0: # capture to left
-            if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[r + moveAmount][c - 1][0] == enemyColor:
-                    if r + moveAmount == backRow: # if piece gets to back rank then it is a pawn promotion
-                        pawnPromotion = True
-                    moves.append(Move((r, c), (r+moveAmount, c-1), self.board, pawnPromotion=True))
-                if (r + moveAmount, c - 1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r+moveAmount, c - 1 ), self.board, enPassant=True))
-                    
-        if c+1 <= 7: # capture to right
-            if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[r + moveAmount][c + 1][0] == enemyColor:
-                    if r + moveAmount == backRow: # if piece gets to back rank then it is a pawn promotion
-                        pawnPromotion = True
-                    moves.append(Move((r, c), (r+moveAmount, c + 1), self.board, pawnPromotion=True))
-                if (r + moveAmount, c + 1) == self.enPassantPossible:
-                    moves.append(Move((r, c), (r+moveAmount, c + 1 ), self.board, enPassant=True))
+        if not captures:
+            return
+        for captureCol in (c - 1, c + 1): # capture to left and right
+            if 0 <= captureCol <= 7 and (pinLine is None or (r+moveAmount)*8 + captureCol in pinLine):
+                if self.board[r + moveAmount][captureCol][0] == enemyColor:
+                    self.addPawnMove(r, c, r+moveAmount, captureCol, backRow, moves)
+                if (r + moveAmount, captureCol) == self.enPassantPossible and self.enPassantIsLegal(r, c, captureCol, moveAmount):
+                    moves.append(encodeMove(r*8 + c, (r+moveAmount)*8 + captureCol, EN_PASSANT_MOVE))
+    
+    '''
+    Add a pawn move to the list, a pawn reaching the back rank adds one move per promotion piece
+    '''
+    def addPawnMove(self, r, c, endRow, endCol, backRow, moves):
+        code = r*8 + c | (endRow*8 + endCol) << 6
+        if endRow == backRow:
+            for i in range(len(PROMOTION_PIECES)):
+                moves.append(code | (PROMOTION_MOVE << 12) | (i << 14))
+        else:
+            moves.append(code)
+    
+    '''
+    En-passant removes two pawns at once, which can uncover a check that the pin detection doesn't see (for example
+    both pawns standing between the king and a rook on the same row), so play it on the board and look for checks
+    '''
+    def enPassantIsLegal(self, r, c, captureCol, moveAmount):
+        allyPawn = self.board[r][c]
+        enemyPawn = self.board[r][captureCol]
+        self.board[r][c] = '--'
+        self.board[r][captureCol] = '--'
+        self.board[r + moveAmount][captureCol] = allyPawn
+        inCheck = self.checkForPinsAndChecks()[0]
+        self.board[r + moveAmount][captureCol] = '--'
+        self.board[r][captureCol] = enemyPawn
+        self.board[r][c] = allyPawn
+        return not inCheck
                     
     '''
     Get all the rook moves for the rook located at row, col and add these moves to the list
     '''
-    def getRookMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q': # can't remove queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
-
-        directions = ((-1, 0), (1, 0), (0, 1), (0, -1))
-        if self.whiteToMove:
-            enemyColor = "b"
-        else:
-            enemyColor = "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                # print(endRow, endCol)
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        # print(endRow, endCol)
-                        if endPiece == "--": # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor: # enemy piece valid (capturing)
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+    def getRookMoves(self, r, c, moves, captures=True, quiets=True):
+        self.getSlidingMoves(r, c, range(4), moves, captures, quiets)
 
     '''
     Get all the knight moves for the knight located at row, col and add these moves to the list
     '''
-    def getKnightMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        
-        directions = ((-2, -1), (-2, 1),
-                      (-1, -2), (-1, 2),
-                      (1, -2), (1, 2),
-                      (2, -1), (2, 1))
+    def getKnightMoves(self, r, c, moves, captures=True, quiets=True):
+        if r*8 + c in self.pinLines: # a pinned knight can never stay on the pin line
+            return
         if self.whiteToMove:
-            allyColor = "w"
+            enemyColor = "b"
         else:
-            allyColor = "b"
-        for d in directions:
-            endRow = r + d[0]
-            endCol = c + d[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+            enemyColor = "w"
+        board = self.board
+        for endSq in KNIGHT_SQUARES[r*8 + c]:
+            endPiece = board[endSq >> 3][endSq & 7]
+            if (quiets and endPiece == '--') or (captures and endPiece[0] == enemyColor):
+                moves.append(r*8 + c | endSq << 6)
     
     '''
     Get all the bishop moves for the bishop located at row, col and add these moves to the list
     '''
-    def getBishopMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
- 
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+    def getBishopMoves(self, r, c, moves, captures=True, quiets=True):
+        self.getSlidingMoves(r, c, range(4, 8), moves, captures, quiets)
+
+    '''
+    Moves of a sliding piece at row, col along the given directions (indexes in DIRECTIONS). A pinned piece only keeps
+    the directions along its pin line.
+    '''
+    def getSlidingMoves(self, r, c, directions, moves, captures=True, quiets=True):
+        startSq = r*8 + c
+        pinLine = self.pinLines.get(startSq)
         if self.whiteToMove:
             enemyColor = "b"
         else:
             enemyColor = "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                # print(endRow, endCol)
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        # print(endRow, endCol)
-                        if endPiece == "--": # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor: # enemy piece valid (capturing)
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+        board = self.board
+        rays = RAYS[startSq]
+        for j in directions:
+            ray = rays[j]
+            if pinLine is not None and ray and ray[0] not in pinLine:
+                continue
+            for endSq in ray:
+                endPiece = board[endSq >> 3][endSq & 7]
+                if endPiece == "--": # empty space valid
+                    if quiets:
+                        moves.append(startSq | endSq << 6)
+                elif endPiece[0] == enemyColor: # enemy piece valid (capturing)
+                    if captures:
+                        moves.append(startSq | endSq << 6)
+                    break
                 else:
                     break
     
     '''
     Get all the queen moves for the queen located at row, col and add these moves to the list
     '''
-    def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+    def getQueenMoves(self, r, c, moves, captures=True, quiets=True):
+        self.getSlidingMoves(r, c, range(8), moves, captures, quiets)
     
     '''
     Get all the king moves for the king located at row, col and add these moves to the list
     '''
-    def getKingMoves(self, r, c, moves):
+    def getKingMoves(self, r, c, moves, captures=True, quiets=True):
         
         rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
         colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
@@ -520,14 +1150,30 @@ class GameState():
             allyColor = "w"
         else:
             allyColor = "b"
-            
+        
+        if self.attackMaps is not None:
+            enemyAttacks = self.attackMaps['b' if allyColor == 'w' else 'w']
+            # the king doesn't block the ray of a piece checking it, so the square behind the king on that ray isn't safe
+            unsafe = ()
+            for check in self.checks:
+                behindRow, behindCol = r - check[2], c - check[3]
+                if self.board[check[0]][check[1]][1] in ('R', 'B', 'Q') and 0 <= behindRow < 8 and 0 <= behindCol < 8:
+                    unsafe += (behindRow * 8 + behindCol,)
+            board = self.board
+            for endSq in KING_SQUARES[r*8 + c]:
+                endPiece = board[endSq >> 3][endSq & 7]
+                if endPiece[0] != allyColor and (captures if endPiece != '--' else quiets) and enemyAttacks[endSq] == 0 and endSq not in unsafe:
+                    moves.append(r*8 + c | endSq << 6)
+            if quiets:
+                self.getCastleMoves(r, c, moves, allyColor)
+            return
         
         for i in range(8):
             endRow = r + rowMoves[i]
             endCol = c + colMoves[i]
             if 0 <= endRow < 8 and 0 <= endCol < 8:
                 endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: # not an ally piece (empty or enemy piece)
+                if endPiece[0] != allyColor and (captures if endPiece != '--' else quiets): # not an ally piece (empty or enemy piece)
                     # place king on end square and check for checks
                     if allyColor == 'w':
                         self.whiteKingLocation = (endRow, endCol)
@@ -535,14 +1181,15 @@ class GameState():
                         self.blackKingLocation = (endRow, endCol)
                     inCheck, pins, checks = self.checkForPinsAndChecks()
                     if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        moves.append(r*8 + c | (endRow*8 + endCol) << 6)
                     # place king back on original location
                     if allyColor == 'w':
                         self.whiteKingLocation = (r, c)
                     else:
                         self.blackKingLocation = (r, c)
         
-        self.getCastleMoves(r, c, moves, allyColor)
+        if quiets:
+            self.getCastleMoves(r, c, moves, allyColor)
 
     '''
     Generate all valid castle moves for the king at (r, c) and add them to the list of moves
@@ -558,12 +1205,20 @@ class GameState():
     def getKingsideCastleMoves(self, r, c, moves, allyColor):
         if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
             if not self.squareUnderAttack(r, c+1, allyColor) and not self.squareUnderAttack(r, c+2, allyColor):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove = True))
+                moves.append(encodeMove(r*8 + c, r*8 + c+2, CASTLE_MOVE))
     
     def getQueensideCastleMoves(self, r, c, moves, allyColor):
         if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
-            if not self.squareUnderAttack(r, c-1, allyColor) and not self.squareUnderAttack(r, c-2, allyColor) and not self.squareUnderAttack(r, c-3, allyColor):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove = True))
+            if not self.squareUnderAttack(r, c-1, allyColor) and not self.squareUnderAttack(r, c-2, allyColor): # the rook may pass an attacked square
+                moves.append(encodeMove(r*8 + c, r*8 + c-2, CASTLE_MOVE))
+
+'''
+GameState that keeps the attack maps of both sides up to date move by move, so asking whether a square is attacked is a
+lookup instead of a board scan. It's opt-in: updating the maps on every move and take-back costs more than the scans it
+saves (Perft.py --benchmark-attacks).
+'''
+class AttackMapGameState(GameState):
+    trackAttacks = True
 
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):
@@ -580,7 +1235,7 @@ class Move():
     filesToCols = {"a":0, "b":1, "c":2, "d":3, "e":4, "f":5, "g":6, "h":7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, enPassant=False, pawnPromotion=False, isCastleMove = False):
+    def __init__(self, startSq, endSq, board, enPassant=False, pawnPromotion=False, isCastleMove = False, promotionChoice=None):
         self.startRow = startSq[0]
         self.startCol = startSq[1]
         self.endRow = endSq[0]
@@ -598,8 +1253,26 @@ class Move():
         # castle move
         self.isCastleMove = isCastleMove
         
+        self.setPromotionChoice(promotionChoice)
+    
+    '''
+    Set the piece a pawn promotion turns into ('Q', 'R', 'B' or 'N') along with the ids that depend on it
+    '''
+    def setPromotionChoice(self, promotionChoice):
+        self.promotionChoice = promotionChoice if self.isPawnPromotion else None
         self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
-        # print(self.moveID)
+        startSq = self.startRow * 8 + self.startCol
+        endSq = self.endRow * 8 + self.endCol
+        if self.promotionChoice is not None:
+            promotion = PROMOTION_PIECES.index(self.promotionChoice)
+            self.moveID += (promotion + 1) * 10000
+            self.code = encodeMove(startSq, endSq, PROMOTION_MOVE, promotion)
+        elif self.enPassant:
+            self.code = encodeMove(startSq, endSq, EN_PASSANT_MOVE)
+        elif self.isCastleMove:
+            self.code = encodeMove(startSq, endSq, CASTLE_MOVE)
+        else:
+            self.code = encodeMove(startSq, endSq)
         
     '''
     Overriding the equals method
@@ -611,7 +1284,53 @@ class Move():
             
     
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.promotionChoice is not None:
+            notation += self.promotionChoice.lower()
+        return notation
     
     def getRankFile(self, r, c):
-        return self.colsToFiles[c] + self.rowsToRanks[r]
\ No newline at end of file
+        return self.colsToFiles[c] + self.rowsToRanks[r]
+
+'''
+Valid moves of a position looked up by start square, or by start and end square, both as (row, col). Only promotions
+have several moves for the same two squares, one per piece.
+'''
+class MoveIndex():
+    def __init__(self, moves, key=None):
+        self.moves = moves
+        self.key = key # Zobrist key of the position
+        self.byStart = {}
+        self.bySquares = {}
+        for move in moves:
+            start = (move.startRow, move.startCol)
+            self.byStart.setdefault(start, []).append(move)
+            self.bySquares.setdefault((start, (move.endRow, move.endCol)), []).append(move)
+    
+    def movesFrom(self, start):
+        return self.byStart.get(start, [])
+    
+    def isPromotion(self, start, end):
+        moves = self.bySquares.get((start, end))
+        return moves is not None and moves[0].isPawnPromotion
+    
+    '''
+    The valid move from start to end, None if there is none. A promotion needs the piece ('Q', 'R', 'B' or 'N').
+    '''
+    def find(self, start, end, promotionChoice=None):
+        for move in self.bySquares.get((start, end), ()):
+            if move.promotionChoice == promotionChoice:
+                return move
+        return None
+
+
+'''
+Coordinate notation of a packed move, like Move.getChessNotation
+'''
+def moveNotation(code):
+    startRow, startCol = SQUARES[code & 63]
+    endRow, endCol = SQUARES[(code >> 6) & 63]
+    notation = Move.colsToFiles[startCol] + Move.rowsToRanks[startRow] + Move.colsToFiles[endCol] + Move.rowsToRanks[endRow]
+    if (code >> 12) & 3 == PROMOTION_MOVE:
+        notation += PROMOTION_PIECES[code >> 14].lower()
+    return notation
\ No newline at end of file
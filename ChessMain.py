@@ -2,13 +2,19 @@
 This is our main driver file. It will be responsible for handling user input and displaying the current GameState object
 """
 
+import threading
+import time
 import pygame as p
-import ChessEngine, SmartMoveFinder
+import ChessEngine, SmartMoveFinder, PawnPromotionMain, TranspositionTable, MoveOrdering
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8 # dimensions fo a chess board are 8x8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15 # for animations later on
+AI_TIME_LIMIT = 1.0 # seconds the AI may think about each move
+AI_MOVE_EVENT = p.USEREVENT + 1 # posted by the AI thread with the move it found
+STOP_SEARCH_EVENT = p.USEREVENT + 2 # timer that ends the AI's time after a ponderhit
+PONDER = True # search the predicted reply while the human is thinking
 IMAGES = {}
 
 '''
@@ -23,16 +29,22 @@ def loadImages():
     
 
 '''
-The main driver for our code. This will handle user input and updating the graphics
+The main driver for our code. This will handle user input and updating the graphics. The loop sleeps until an event
+comes in; the AI searches on a worker thread (on its own game state, with its own Searcher) and posts its move back as
+an AI_MOVE_EVENT, so the window keeps drawing and taking input while it thinks. While a human plays against the AI, the
+AI ponders on the human's time (see AISearch).
 '''
 def main():
     p.init()
     screen = p.display.set_mode((WIDTH, HEIGHT))
-    clock = p.time.Clock()
     screen.fill(p.Color("white"))
     gs = ChessEngine.GameState()
+    transpositionTable = TranspositionTable.TranspositionTable() # what the AI's searches learn, kept for the next one
+    moveOrderer = MoveOrdering.MoveOrderer()
+    renderer = BoardRenderer()
+    message = None # game over text, drawn over the board
     
-    validMoves = gs.getValidMoves()
+    moveIndex = gs.getValidMoveIndex() # valid moves by start square and by start and end squares
     moveMade = False # flag variable for when a move is made
     
     
@@ -43,9 +55,48 @@ def main():
     gameOver = False
     playerOne = False # If a human is playing white, then this will be True. If an AI is playing, then it will be False
     playerTwo = False # Same as above but for black
+    aiSearch = None # AISearch running, if any
+    searchId = 0 # tells the move of a cancelled search apart from the current one
+    ponderFrom = None # Zobrist key of the position the AI's last move left, if it predicted the human's reply
+    ponderMove = None # that predicted reply, which the AI ponders on
     while running:
+        if moveMade:
+            moveIndex = gs.getValidMoveIndex()
+            moveMade = False
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
-        for e in p.event.get():
+        
+        dirtyRects = renderer.draw(screen, gs, moveIndex, sqSelected)
+        
+        if gs.isCheckmate():
+            text = '!!Black wins by checkmate!!' if gs.whiteToMove else '!!White wins by checkmate!!'
+        elif gs.isStalemate():
+            text = 'Stalemate'
+        elif gs.isDraw():
+            text = 'Draw by ' + gs.gameStatus()
+        else:
+            text = None
+        gameOver = text is not None
+        if text is not None and (text != message or dirtyRects): # squares redrawn under the text cover part of it
+            dirtyRects.append(drawText(screen, text))
+        elif text is None and message is not None: # the game went on after an undo
+            renderer.invalidate()
+            dirtyRects = renderer.draw(screen, gs, moveIndex, sqSelected)
+        message = text
+        
+        if dirtyRects:
+            p.display.update(dirtyRects)
+        
+        # AI move finder logic
+        if not gameOver and aiSearch is None:
+            if not humanTurn:
+                searchId += 1
+                aiSearch = AISearch(gs, searchId, transpositionTable, moveOrderer)
+            elif PONDER and not (playerTwo if gs.whiteToMove else playerOne) and ponderFrom == gs.zobristKey: # the AI replies to this human
+                ponderFrom = None
+                searchId += 1
+                aiSearch = AISearch(gs, searchId, transpositionTable, moveOrderer, ponderMove)
+        
+        for e in [p.event.wait()] + p.event.get(): # sleep until something happens, then handle everything that did
             if e.type == p.QUIT:
                 running = False
                 
@@ -62,87 +113,191 @@ def main():
                         sqSelected = (row, col)
                         playerClicks.append(sqSelected) # append both 1st and 2nd clicks?>.
                     if len(playerClicks) == 2: # after 2nd click
-                        move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
-                        for i in range(len(validMoves)):
-                            if move == validMoves[i]:
-                                gs.makeMove(validMoves[i])
-                                moveMade = True
-                                print(move.getChessNotation())
-                                sqSelected = () # reset user clicks
-                                playerClicks = []
-                        if not moveMade:
+                        promotionChoice = None
+                        if moveIndex.isPromotion(playerClicks[0], playerClicks[1]): # ask which piece to promote to
+                            promotionChoice = PawnPromotionMain.main(gs.whiteToMove)
+                            screen = p.display.get_surface() # the promotion window drew over the board
+                            renderer.invalidate()
+                            message = None
+                        move = moveIndex.find(playerClicks[0], playerClicks[1], promotionChoice)
+                        if move is not None:
+                            if aiSearch is not None: # pondering
+                                if move.code == aiSearch.predictedMove:
+                                    aiSearch.ponderHit()
+                                else:
+                                    aiSearch = aiSearch.cancel()
+                            gs.makeMove(move)
+                            moveMade = True
+                            print(move.getChessNotation())
+                            sqSelected = () # reset user clicks
+                            playerClicks = []
+                        else:
                             playerClicks = [sqSelected]
                             
+            elif e.type == p.VIDEOEXPOSE: # the window contents were lost, draw everything again
+                renderer.invalidate()
+                message = None
+                
             # key handler
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z: # undo when 'z' is pressed
+                    if aiSearch is not None:
+                        aiSearch = aiSearch.cancel()
                     gs.undoMove()
                     moveMade = True
-                    
-        # AI move finder logic
-        if not gameOver and not humanTurn:
-            AIMove = SmartMoveFinder.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-                
-        if moveMade:
-            validMoves = gs.getValidMoves()
-            moveMade = False
             
-        drawGameState(screen, gs, validMoves, sqSelected)
-        
-        if gs.checkMate:
-            gameOver = True
-            if gs.whiteToMove:
-                drawText(screen, '!!Black wins by checkmate!!')
-            else:
-                drawText(screen, '!!White wins by checkmate!!')
-        elif gs.staleMate:
-            gameOver = True
-            drawText(screen, 'Stalemate')
-        
-        
-        clock.tick(MAX_FPS)
-        p.display.flip()
+            # the AI found its move
+            elif e.type == AI_MOVE_EVENT:
+                if aiSearch is not None and e.searchId == aiSearch.searchId: # not from a search cancelled in the meantime
+                    aiSearch.thread.join()
+                    aiSearch = None
+                    for move in moveIndex.moves:
+                        if move.code == e.move:
+                            gs.makeMove(move)
+                            moveMade = True
+                            break
+                    if e.reply is not None:
+                        ponderFrom = gs.zobristKey
+                        ponderMove = e.reply
+            
+            # the AI used up its time after a ponderhit
+            elif e.type == STOP_SEARCH_EVENT:
+                if aiSearch is not None and e.searchId == aiSearch.searchId:
+                    aiSearch.searcher.stop()
+    
+    if aiSearch is not None:
+        aiSearch.cancel()
 
 
 '''
-Responsible for all the graphics within a current game state.
+The AI's search on a worker thread. The thread rebuilds the game state from its start FEN and moves (gs.gameHistory), and
+searches it with a Searcher of its own (sharing the game's transposition table and move orderer, which only one search
+uses at a time), so stopping or cancelling it never touches another search. A normal search posts its move as an
+AI_MOVE_EVENT after AI_TIME_LIMIT seconds, together with the human's most likely reply to it: the best move the
+transposition table has for the position after the move (the search went through it), or None. A ponder search starts
+while the human is thinking, from the position after that predictedMove, and has no time limit: if the human plays that
+move ponderHit lets it go on until the AI has searched AI_TIME_LIMIT seconds in all (so the reply is deeper, or
+instant), otherwise it's cancelled and only its transposition table entries are kept.
 '''
-def drawGameState(screen, gs, validMoves, sqSelected):
-    drawBoard(screen) # draw squares on the board
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs.board) # draw pieces on top of those squares
+class AISearch():
+    def __init__(self, gs, searchId, tt, moveOrderer, predictedMove=None):
+        self.searchId = searchId
+        self.predictedMove = predictedMove # packed move of the human the search ponders on, None for a normal search
+        self.startTime = time.perf_counter()
+        self.decided = threading.Event() # the move may be posted: not pondering, or the ponder was hit or cancelled
+        if predictedMove is None:
+            self.decided.set()
+        self.searcher = SmartMoveFinder.Searcher(tt, moveOrderer)
+        startFen, codes = gs.gameHistory()
+        if predictedMove is not None:
+            codes.append(predictedMove)
+        self.thread = threading.Thread(target=self.run, args=(type(gs), startFen, codes), daemon=True)
+        self.thread.start()
+    
+    def run(self, gameClass, startFen, codes):
+        gs = gameClass.fromFEN(startFen)
+        for code in codes:
+            gs.makeMoveCode(code)
+        validMoves = gs.getValidMoves()
+        timeLimit = AI_TIME_LIMIT if self.predictedMove is None else None
+        AIMove = self.searcher.findBestMove(gs, validMoves, SmartMoveFinder.MAX_DEPTH, timeLimit=timeLimit)
+        if AIMove is None and len(validMoves) > 0:
+            AIMove = SmartMoveFinder.findRandomMove(validMoves)
+        reply = None
+        if AIMove is not None:
+            gs.makeMoveCode(AIMove.code)
+            entry = self.searcher.transpositionTable.probe(gs.zobristKey)
+            if entry is not None and entry[3] in gs.getValidMoveCodes():
+                reply = entry[3]
+        self.decided.wait() # a ponder search that ended by itself (it found a mate) waits for the human's move
+        p.event.post(p.event.Event(AI_MOVE_EVENT, move=AIMove.code if AIMove is not None else None, reply=reply,
+                                   searchId=self.searchId))
     
+    '''
+    The human played the predicted move: stop once the AI has had AI_TIME_LIMIT seconds since the ponder search started
+    '''
+    def ponderHit(self):
+        self.decided.set()
+        remaining = self.startTime + AI_TIME_LIMIT - time.perf_counter()
+        if remaining <= 0:
+            self.searcher.stop()
+        else:
+            p.time.set_timer(p.event.Event(STOP_SEARCH_EVENT, searchId=self.searchId), int(remaining * 1000) + 1, 1)
+    
+    '''
+    Stop the search and wait for its thread, which only takes until the search checks its limits at the next node. The
+    move it posts is ignored. Returns None, the new aiSearch.
+    '''
+    def cancel(self):
+        self.searcher.stop()
+        self.decided.set()
+        self.thread.join()
+        return None
+
 
 '''
-Highlight square selected and moves for piece selected
+Draws the board and keeps what it drew, so each frame only the squares that changed since the last one (a move made or
+taken back, a new selection) are drawn again and handed to display.update. The board background and the highlight and
+move dot overlays are rendered once.
 '''
-def highlightSquares(screen, gs, validMoves, sqSelected):
-    if sqSelected != ():
-        r, c = sqSelected
-        if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'): #sqSelected is a piece that can be moved
-            # highlight selected square
-            s = p.Surface((SQ_SIZE, SQ_SIZE))
-            s.set_alpha(255) # transperancy value -> 0 transparent; 255 opaque
-            t = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA, 32)
-            t = t.convert_alpha()
-            t.set_alpha(100)
-            center = (SQ_SIZE // 2, SQ_SIZE // 2)
-            radius = 10
-            s.fill(p.Color('pale turquoise'))
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
-            t.fill(p.Color(0,0,0,0))
-            p.draw.circle(t, 'black', center, radius)
-            for move in validMoves:
-                if move.startRow == r and move.startCol == c:
-                    screen.blit(t, (SQ_SIZE*move.endCol, SQ_SIZE*move.endRow))
-            
-        
-        
+class BoardRenderer():
+    def __init__(self):
+        self.background = p.Surface((WIDTH, HEIGHT))
+        drawBoard(self.background)
+        self.selection = p.Surface((SQ_SIZE, SQ_SIZE)) # highlight of the selected square
+        self.selection.fill(p.Color('pale turquoise'))
+        self.dot = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA, 32).convert_alpha() # marks the squares it can move to
+        self.dot.fill(p.Color(0, 0, 0, 0))
+        p.draw.circle(self.dot, 'black', (SQ_SIZE // 2, SQ_SIZE // 2), 10)
+        self.dot.set_alpha(100) # transperancy value -> 0 transparent; 255 opaque
+        self.invalidate()
+    
+    '''
+    Draw every square on the next frame
+    '''
+    def invalidate(self):
+        self.shownPieces = None # piece on each square as last drawn, row by row
+        self.shownSelected = ()
+        self.shownTargets = set()
+    
+    '''
+    Draw the squares that changed and return their rects (an empty list when nothing changed)
+    '''
+    def draw(self, screen, gs, moveIndex, sqSelected):
+        selected = ()
+        targets = set()
+        if sqSelected != ():
+            r, c = sqSelected
+            if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'): # sqSelected is a piece that can be moved
+                selected = sqSelected
+                targets = {(move.endRow, move.endCol) for move in moveIndex.movesFrom(sqSelected)}
+        pieces = [piece for row in gs.board for piece in row]
+        if self.shownPieces is None:
+            dirty = set(ChessEngine.SQUARES)
+        else:
+            dirty = {ChessEngine.SQUARES[sq] for sq in range(64) if pieces[sq] != self.shownPieces[sq]}
+            if selected != self.shownSelected:
+                dirty.update(square for square in (selected, self.shownSelected) if square != ())
+            dirty |= targets ^ self.shownTargets
+        rects = []
+        for r, c in dirty:
+            rect = p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE)
+            screen.blit(self.background, rect, rect)
+            if (r, c) == selected:
+                screen.blit(self.selection, rect)
+            if (r, c) in targets:
+                screen.blit(self.dot, rect)
+            piece = pieces[r * 8 + c]
+            if piece != "--": # not empty square
+                screen.blit(IMAGES[piece], rect)
+            rects.append(rect)
+        self.shownPieces = pieces
+        self.shownSelected = selected
+        self.shownTargets = targets
+        return rects
+    
 
 '''
-
 Draw the squares on the board. The top left square is always light.
 '''
 def drawBoard(screen):
@@ -154,16 +309,8 @@ def drawBoard(screen):
                 
 
 '''
-Draw the pieces on the board using the current GameState.board
+Draw text in the middle of the screen, returns the rect it covers
 '''
-def drawPieces(screen, board):
-    for r in range(DIMENSION):
-        for c in range(DIMENSION):
-            piece = board[r][c]
-            if piece != "--": # not empty square
-                screen.blit(IMAGES[piece], p.Rect(c*SQ_SIZE, r*SQ_SIZE, SQ_SIZE, SQ_SIZE))
-                
-
 def drawText(screen, text):
     font = p.font.SysFont("Helvitca", 45, True, False)
     textObject = font.render(text, 0 , p.Color('Black'))
@@ -171,6 +318,7 @@ def drawText(screen, text):
     screen.blit(textObject, textLocation)
     textObject = font.render(text, 0, p.Color('red'))
     screen.blit(textObject, textLocation.move(2,2))
+    return textLocation.inflate(2, 2).move(1, 1)
 
 '''
 Calling the main function using the python prefered way
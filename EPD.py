@@ -0,0 +1,94 @@
+"""
+What the tools that work through many positions share (BatchAnalysis.py, Tournament.py for its openings and games,
+Perft.py): reading positions from FEN and EPD files, one position per line, the GameState backends they can be played
+on, and running tasks on a pool of worker processes.
+
+for index, fen, positionId in EPD.readPositions('positions.epd'):
+    gs = EPD.BACKENDS['bitboard'].fromFEN(fen)
+"""
+import collections
+import concurrent.futures
+import os
+
+import ChessEngine
+import BitboardEngine
+
+BACKENDS = {'string': ChessEngine.GameState, 'attackmaps': ChessEngine.AttackMapGameState,
+            'bitboard': BitboardEngine.BitboardGameState} # GameState implementations by --backend name
+PENDING_PER_WORKER = 4 # default backpressure window of runOnPool, in tasks per worker
+
+
+'''
+Yield (index, fen, id) for every position in a FEN or EPD file. EPD lines only have the first four FEN fields followed by
+operations like 'bm e4; id "pos 1";', the id operation is kept when there is one. Blank lines and lines starting with #
+are skipped. The index counts positions, not lines.
+'''
+def readPositions(path):
+    index = 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split(None, 6)
+            if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit():
+                fen = ' '.join(fields[:6])
+                positionId = ''
+            else:
+                fields = line.split(None, 4)
+                fen = ' '.join(fields[:4])
+                positionId = epdId(fields[4]) if len(fields) > 4 else ''
+            yield index, fen, positionId
+            index += 1
+
+
+def epdId(operations):
+    for operation in operations.split(';'):
+        operation = operation.strip()
+        if operation.startswith('id '):
+            return operation[3:].strip().strip('"')
+    return ''
+
+
+workerState = None # in a worker process of runOnPool: what its setup function returned
+
+
+def initPoolWorker(setup, setupArgs):
+    global workerState
+    workerState = setup(*setupArgs)
+
+
+def runPoolTask(function, task):
+    return function(workerState, task)
+
+
+'''
+Run function(state, task) for every task on a pool of worker processes and yield the results, in task order or, with
+ordered=False, as soon as each one is done. state is what setup(*setupArgs) returned when the worker process started
+(searchers and settings the worker keeps from one task to the next). Tasks are taken from the iterable only when fewer
+than maxPending of them are waiting in the pool, so a huge input is never loaded at once and the reader never runs far
+ahead of the workers. function and setup must be module-level functions so they can be sent to the workers.
+'''
+def runOnPool(function, tasks, setup, setupArgs=(), workers=None, ordered=True, maxPending=None):
+    workers = workers or os.cpu_count() or 1
+    maxPending = maxPending or workers * PENDING_PER_WORKER
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=initPoolWorker,
+                                                initargs=(setup, setupArgs)) as pool:
+        if ordered:
+            pending = collections.deque()
+            for task in tasks:
+                if len(pending) >= maxPending:
+                    yield pending.popleft().result() # wait for the oldest one, later ones keep running meanwhile
+                pending.append(pool.submit(runPoolTask, function, task))
+            while pending:
+                yield pending.popleft().result()
+        else:
+            pending = set()
+            for task in tasks:
+                if len(pending) >= maxPending:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+                pending.add(pool.submit(runPoolTask, function, task))
+            for future in concurrent.futures.as_completed(pending):
+                yield future.result()
@@ -0,0 +1,156 @@
+"""
+Static evaluation: material plus piece-square tables, tapered between a middlegame and an endgame score by the amount of
+material left on the board (the game phase).
+
+GameState keeps mgScore, egScore and phase up to date in makeMoveCode/undoMoveCode with the tables below, so evaluate(gs)
+only has to blend them. scoreBoard recomputes the three of them from scratch: GameState.checkIncrementalState compares
+them with the kept ones (Perft.py --check-hash and tests/test_incremental.py), and evaluateBoard blends them the same
+way as evaluate.
+Scores are in centipawns, positive is good for white.
+"""
+
+# material, middlegame and endgame
+MG_VALUES = {'P': 100, 'N': 320, 'B': 330, 'R': 500, 'Q': 900, 'K': 0}
+EG_VALUES = {'P': 120, 'N': 300, 'B': 320, 'R': 520, 'Q': 920, 'K': 0}
+
+# game phase: every minor piece counts 1, a rook 2 and a queen 4, so the start position is MAX_PHASE
+PHASE_WEIGHTS = {'P': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24
+
+# piece-square tables from white's point of view, laid out like the board: first row is rank 8, square number row * 8 + col
+PAWN_MG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0)
+
+PAWN_EG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0)
+
+KNIGHT = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50)
+
+BISHOP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20)
+
+ROOK = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0)
+
+QUEEN = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20)
+
+KING_MG = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20)
+
+KING_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50)
+
+MG_TABLES = {'P': PAWN_MG, 'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING_MG}
+EG_TABLES = {'P': PAWN_EG, 'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING_EG}
+
+'''
+Value of every piece on every square with the material included, signed for white. A black piece uses the white table
+flipped vertically (square ^ 56) and negated.
+'''
+def buildScores(values, tables):
+    scores = {}
+    for piece, table in tables.items():
+        scores['w' + piece] = [values[piece] + table[sq] for sq in range(64)]
+        scores['b' + piece] = [-(values[piece] + table[sq ^ 56]) for sq in range(64)]
+    return scores
+
+MG_SCORES = buildScores(MG_VALUES, MG_TABLES) # MG_SCORES[piece][sq]
+EG_SCORES = buildScores(EG_VALUES, EG_TABLES)
+PHASES = {color + piece: weight for color in 'wb' for piece, weight in PHASE_WEIGHTS.items()}
+
+
+'''
+Middlegame score, endgame score and phase of a board, counted square by square
+'''
+def scoreBoard(board):
+    mgScore = 0
+    egScore = 0
+    phase = 0
+    for r in range(8):
+        for c in range(8):
+            piece = board[r][c]
+            if piece != '--':
+                mgScore += MG_SCORES[piece][r * 8 + c]
+                egScore += EG_SCORES[piece][r * 8 + c]
+                phase += PHASES[piece]
+    return mgScore, egScore, phase
+
+
+'''
+Blend the middlegame and endgame scores, the phase is capped since promotions can push it past the start position
+'''
+def taper(mgScore, egScore, phase):
+    phase = min(phase, MAX_PHASE)
+    return (mgScore * phase + egScore * (MAX_PHASE - phase)) // MAX_PHASE
+
+
+'''
+Evaluation of the game state from the scores it keeps up to date while moves are made
+'''
+def evaluate(gs):
+    return taper(gs.mgScore, gs.egScore, gs.phase)
+
+
+'''
+The same evaluation computed from scratch, to check the incremental one
+'''
+def evaluateBoard(board):
+    return taper(*scoreBoard(board))
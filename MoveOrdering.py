@@ -0,0 +1,185 @@
+"""
+Move ordering for the search. Alpha-beta cuts off sooner the earlier the best move is searched, so moves are scored
+and handed out best first:
+1. the move stored in the transposition table for the position (hash move)
+2. captures and promotions, most valuable victim first and then least valuable attacker (MVV-LVA)
+3. killer moves: quiet moves that caused a cutoff at the same ply in a sibling position (two slots per ply)
+4. other quiet moves by their history score, which grows every time the piece moving to that square causes a cutoff
+
+The moves are not sorted up front: orderedMoves picks the best remaining move each time the next one is asked for
+(selection sort on demand), so a node that cuts off after a few moves doesn't pay for sorting all of them.
+
+Moves are packed moves (see ChessEngine.encodeMove) and the pieces involved are read from the board they are played on.
+
+staticExchange tells whether a capture wins or loses material once every piece attacking the square has joined in, the
+quiescence search uses it to skip losing captures.
+"""
+from ChessEngine import EN_PASSANT_MOVE, PROMOTION_MOVE, PROMOTION_PIECES, RAYS, KNIGHT_SQUARES, KING_SQUARES, PAWN_ATTACK_SQUARES
+from Evaluation import MG_VALUES
+
+victimValue = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 0}
+attackerValue = {'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORES = (90000, 80000)
+HISTORY_MAX = 50000 # history scores are kept below the killer scores
+MAX_PLY = 128
+SEE_VALUES = dict(MG_VALUES, K=20000) # a king can capture, but never into an attacked square
+
+
+class MoveOrderer():
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)] # packed moves, 0 means empty
+        self.history = {color + piece: [0] * 64 for color in 'wb' for piece in 'PNBRQK'}
+
+    '''
+    Called at the start of every search: killers belong to the previous position, history is only halved so it keeps
+    some of what it learned
+    '''
+    def newSearch(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)]
+        for table in self.history.values():
+            for sq in range(64):
+                table[sq] //= 2
+
+    def scoreMoves(self, moves, board, ply, hashMove):
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history
+        scores = []
+        for move in moves:
+            endSq = (move >> 6) & 63
+            flag = (move >> 12) & 3
+            pieceCaptured = board[endSq >> 3][endSq & 7]
+            if move == hashMove:
+                scores.append(HASH_MOVE_SCORE)
+            elif pieceCaptured != '--' or flag == EN_PASSANT_MOVE or flag == PROMOTION_MOVE:
+                startSq = move & 63
+                score = CAPTURE_SCORE
+                if pieceCaptured != '--':
+                    score += victimValue[pieceCaptured[1]] * 10 - attackerValue[board[startSq >> 3][startSq & 7][1]]
+                elif flag == EN_PASSANT_MOVE:
+                    score += victimValue['P'] * 10 - attackerValue['P']
+                if flag == PROMOTION_MOVE:
+                    score += victimValue[PROMOTION_PIECES[move >> 14]] * 10
+                scores.append(score)
+            elif move == killers[0]:
+                scores.append(KILLER_SCORES[0])
+            elif move == killers[1]:
+                scores.append(KILLER_SCORES[1])
+            else:
+                startSq = move & 63
+                scores.append(history[board[startSq >> 3][startSq & 7]][endSq])
+        return scores
+
+    '''
+    Yields the moves from the highest to the lowest score, finding the next best one only when it is asked for
+    '''
+    def orderedMoves(self, moves, board, ply, hashMove=0):
+        moves = list(moves)
+        scores = self.scoreMoves(moves, board, ply, hashMove)
+        count = len(moves)
+        for i in range(count):
+            best = max(range(i, count), key=scores.__getitem__)
+            if best != i:
+                moves[i], moves[best] = moves[best], moves[i]
+                scores[i], scores[best] = scores[best], scores[i]
+            yield moves[i]
+
+    '''
+    Record a quiet move that caused a beta cutoff, board is the position the move is played from
+    '''
+    def updateQuietCutoff(self, move, board, ply, depth):
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+        startSq = move & 63
+        table = self.history[board[startSq >> 3][startSq & 7]]
+        sq = (move >> 6) & 63
+        table[sq] += depth * depth
+        if table[sq] > HISTORY_MAX: # keep the scale, halve everything once a counter gets too big
+            for values in self.history.values():
+                for i in range(64):
+                    values[i] //= 2
+
+
+def isQuiet(move, board):
+    endSq = (move >> 6) & 63
+    flag = (move >> 12) & 3
+    return board[endSq >> 3][endSq & 7] == '--' and flag != EN_PASSANT_MOVE and flag != PROMOTION_MOVE
+
+
+'''
+Material won (negative when lost) by the side making the capture move after both sides keep recapturing on the end
+square with their least valuable attacker, each side free to stop when going on would lose more. Pins are ignored.
+'''
+def staticExchange(board, move):
+    startSq = move & 63
+    endSq = (move >> 6) & 63
+    flag = (move >> 12) & 3
+    piece = board[startSq >> 3][startSq & 7]
+    removed = {startSq} # pieces that have moved onto the end square, they no longer block or attack
+    if flag == EN_PASSANT_MOVE:
+        capturedSq = (startSq & ~7) | (endSq & 7)
+        removed.add(capturedSq)
+        gain = [SEE_VALUES['P']]
+    else:
+        captured = board[endSq >> 3][endSq & 7]
+        gain = [SEE_VALUES[captured[1]] if captured != '--' else 0]
+    pieceValue = SEE_VALUES[piece[1]] # value of the piece standing on the end square
+    if flag == PROMOTION_MOVE:
+        pieceValue = SEE_VALUES[PROMOTION_PIECES[move >> 14]]
+        gain[0] += pieceValue - SEE_VALUES['P']
+    color = 'b' if piece[0] == 'w' else 'w'
+    while True:
+        attacker = leastValuableAttacker(board, endSq, color, removed)
+        if attacker is None:
+            break
+        gain.append(pieceValue - gain[-1]) # gain of color after capturing the piece on the square
+        if max(-gain[-2], gain[-1]) < 0: # neither side can come out ahead by going on
+            gain.pop() # and this capture won't be made, so it must not count below
+            break
+        attackerSq, pieceValue = attacker
+        removed.add(attackerSq)
+        color = 'b' if color == 'w' else 'w'
+    for i in range(len(gain) - 1, 0, -1): # each side only recaptures when it pays off
+        gain[i - 1] = -max(-gain[i - 1], gain[i])
+    return gain[0]
+
+
+'''
+(square, value) of the cheapest piece of the given color attacking sq, skipping the squares in removed, or None
+'''
+def leastValuableAttacker(board, sq, color, removed):
+    pawn = color + 'P'
+    for fromSq in PAWN_ATTACK_SQUARES['b' if color == 'w' else 'w'][sq]: # a pawn attacks sq from where an enemy pawn on sq would attack
+        if board[fromSq >> 3][fromSq & 7] == pawn and fromSq not in removed:
+            return fromSq, SEE_VALUES['P']
+    knight = color + 'N'
+    for fromSq in KNIGHT_SQUARES[sq]:
+        if board[fromSq >> 3][fromSq & 7] == knight and fromSq not in removed:
+            return fromSq, SEE_VALUES['N']
+    best = None
+    rays = RAYS[sq]
+    for j in range(8):
+        for fromSq in rays[j]:
+            if fromSq in removed: # x-ray through pieces that already captured
+                continue
+            piece = board[fromSq >> 3][fromSq & 7]
+            if piece == '--':
+                continue
+            if piece[0] == color and (piece[1] == 'Q' or piece[1] == ('R' if j < 4 else 'B')):
+                if best is None or SEE_VALUES[piece[1]] < best[1]:
+                    best = (fromSq, SEE_VALUES[piece[1]])
+            break
+    if best is not None:
+        return best
+    king = color + 'K'
+    for fromSq in KING_SQUARES[sq]:
+        if board[fromSq >> 3][fromSq & 7] == king and fromSq not in removed:
+            return fromSq, SEE_VALUES['K']
+    return None
@@ -0,0 +1,279 @@
+"""
+Reading and writing games in PGN. readGames streams a PGN file one game at a time, so even a huge database is never
+held in memory: tags are parsed as they come and the moves of a game are turned from SAN into ChessEngine.Move objects
+by matching them against the legal moves of the position. formatGame and writeGame go the other way, from SAN moves or
+from the move log of a GameState.
+
+for game in PGN.readGames('games.pgn'):
+    print(game.tags['White'], game.tags['Black'], game.result, len(game.moves))
+
+python PGN.py games.pgn                 (check every game of a file and report parsing speed)
+"""
+import argparse
+import collections
+import re
+import time
+
+import ChessEngine
+from ChessEngine import SQUARES, PROMOTION_PIECES, CASTLE_MOVE, PROMOTION_MOVE
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+SEVEN_TAG_ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+LINE_LENGTH = 79 # movetext lines are kept shorter than 80 characters
+
+# tags (name -> value, in file order), moves (ChessEngine.Move list, empty when moves aren't parsed), result and the
+# reason the moves stopped early (None when the whole game was read)
+PGNGame = collections.namedtuple('PGNGame', 'tags moves result error')
+
+TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|[^\s(){};$]+')
+MOVE_NUMBER = re.compile(r'\d+\.*')
+SAN = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?')
+ANNOTATIONS = '+#!?'
+
+'''
+Yield a PGNGame for every game of a PGN file (a path or an open text file). The file is read line by line and a game is
+handed out as soon as the next one starts. With parseMoves=False only the tags and result are read, which is much faster
+when only they are needed. Moves are played on gameClass positions; an illegal or unreadable move ends the moves of that
+game with error set, and reading goes on with the next game.
+'''
+def readGames(source, parseMoves=True, gameClass=ChessEngine.GameState):
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', errors='replace') as f:
+            yield from readGames(f, parseMoves, gameClass)
+        return
+    tags = {}
+    movetext = []
+    hasMovetext = False # blank lines before the first tag or between the tags don't start a game
+    inComment = False # inside a {} comment that goes on over several lines
+    for line in source:
+        if not inComment:
+            if line.startswith('%'): # escaped line
+                continue
+            stripped = line.strip()
+            if stripped.startswith('['):
+                if hasMovetext: # the tags of the next game
+                    yield buildGame(tags, movetext, parseMoves, gameClass)
+                    tags = {}
+                    movetext = []
+                    hasMovetext = False
+                match = TAG.match(stripped)
+                if match:
+                    tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+                continue
+        movetext.append(line)
+        hasMovetext = hasMovetext or not line.isspace()
+        inComment = commentOpen(line, inComment)
+    if tags or hasMovetext:
+        yield buildGame(tags, movetext, parseMoves, gameClass)
+
+
+'''
+Whether a {} comment is still open at the end of a movetext line (a ; comment runs to the end of its line)
+'''
+def commentOpen(line, inComment):
+    for char in line:
+        if inComment:
+            inComment = char != '}'
+        elif char == '{':
+            inComment = True
+        elif char == ';':
+            break
+    return inComment
+
+
+'''
+PGNGame of one game's tags and movetext lines. Any error setting up the position or playing the moves, not only a bad
+move, ends the moves of the game with error set, so it never ends the stream of games.
+'''
+def buildGame(tags, movetext, parseMoves, gameClass):
+    sanTexts, result = parseMovetext(''.join(movetext))
+    result = result or tags.get('Result', '*')
+    if not parseMoves:
+        return PGNGame(tags, [], result, None)
+    moves = []
+    error = None
+    gs = None
+    try:
+        gs = gameClass.fromFEN(tags['FEN']) if 'FEN' in tags else gameClass()
+        for san in sanTexts:
+            code = sanToMoveCode(gs, san, gs.getValidMoveCodes())
+            move = ChessEngine.moveFromCode(code, gs.board)
+            gs.makeMoveCode(code)
+            moves.append(move)
+    except Exception as e:
+        error = str(e) if isinstance(e, ValueError) else type(e).__name__ + ': ' + str(e)
+        if gs is None:
+            error = 'bad FEN tag: ' + error
+    return PGNGame(tags, moves, result, error)
+
+
+'''
+SAN moves of the main line of a game's movetext and its result (None when there is none): comments, NAGs, move numbers
+and variations are skipped.
+'''
+def parseMovetext(text):
+    sanMoves = []
+    result = None
+    depth = 0 # variation nesting
+    for token in TOKEN.findall(text):
+        first = token[0]
+        if first == '{' or first == ';' or first == '$':
+            continue
+        if first == '(':
+            depth += 1
+            continue
+        if first == ')':
+            depth = max(depth - 1, 0)
+            continue
+        if depth > 0:
+            continue
+        if token in RESULTS:
+            result = token
+            continue
+        number = MOVE_NUMBER.match(token)
+        if number and (number.end() == len(token) or token[number.end() - 1] == '.'): # 12. or 12... or 12.e4
+            token = token[number.end():]
+            if not token:
+                continue
+        sanMoves.append(token)
+    return sanMoves, result
+
+
+'''
+The legal packed move a SAN move stands for, raises ValueError when it doesn't match exactly one. legalMoves are the
+valid move codes of the position. Check and annotation marks are optional, and so are '=' before a promotion piece and
+'x' for captures.
+'''
+def sanToMoveCode(gs, san, legalMoves):
+    text = san.rstrip(ANNOTATIONS)
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        kingside = len(text) == 3
+        for code in legalMoves:
+            if (code >> 12) & 3 == CASTLE_MOVE and ((code >> 6) & 7 > code & 7) == kingside:
+                return code
+        raise ValueError('illegal move ' + san)
+    match = SAN.fullmatch(text)
+    if match is None:
+        raise ValueError('unreadable move ' + san)
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    piece = piece or 'P'
+    endSq = ChessEngine.Move.ranksToRows[target[1]] * 8 + ChessEngine.Move.filesToCols[target[0]]
+    fromCol = ChessEngine.Move.filesToCols[fromFile] if fromFile else None
+    fromRow = ChessEngine.Move.ranksToRows[fromRank] if fromRank else None
+    found = None
+    for code in legalMoves:
+        if (code >> 6) & 63 != endSq or (code >> 12) & 3 == CASTLE_MOVE:
+            continue
+        startRow, startCol = SQUARES[code & 63]
+        if gs.board[startRow][startCol][1] != piece or (fromCol is not None and startCol != fromCol) or \
+                (fromRow is not None and startRow != fromRow):
+            continue
+        if (code >> 12) & 3 == PROMOTION_MOVE:
+            if promotion is None or PROMOTION_PIECES[code >> 14] != promotion.upper():
+                continue
+        elif promotion is not None:
+            continue
+        if found is not None:
+            raise ValueError('ambiguous move ' + san)
+        found = code
+    if found is None:
+        raise ValueError('illegal move ' + san)
+    return found
+
+
+'''
+SAN of every move in the move log of a game state, and the FEN of the position before the first one. The moves are
+replayed on a copy of the game, the game state itself isn't touched.
+'''
+def sanMoves(gs):
+    startFen, codes = gs.gameHistory()
+    replay = type(gs).fromFEN(startFen)
+    moves = []
+    for code in codes:
+        moves.append(replay.sanNotation(code))
+        replay.makeMoveCode(code)
+    return startFen, moves
+
+
+'''
+PGN text of a game: the tags (the seven tag roster first, in its order, then the rest) and the SAN moves, numbered from
+the FEN tag when there is one. comment, when given, is written in braces between the last move and the result.
+'''
+def formatGame(tags, moves, result, comment=None):
+    tags = dict(tags)
+    tags['Result'] = result
+    fields = tags['FEN'].split() if 'FEN' in tags else ['', 'w']
+    whiteToMove = fields[1] == 'w'
+    moveNumber = int(fields[5]) if len(fields) > 5 else 1
+    lines = ['[%s "%s"]' % (name, tags.get(name, '?').replace('\\', '\\\\').replace('"', '\\"')) for name in SEVEN_TAG_ROSTER]
+    lines += ['[%s "%s"]' % (name, value.replace('\\', '\\\\').replace('"', '\\"')) for name, value in tags.items()
+              if name not in SEVEN_TAG_ROSTER]
+    lines.append('')
+    tokens = []
+    for san in moves:
+        if whiteToMove:
+            tokens.append(str(moveNumber) + '.')
+        elif not tokens:
+            tokens.append(str(moveNumber) + '...')
+        tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    if comment:
+        tokens.append('{' + comment.replace('}', '') + '}')
+    tokens.append(result)
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+'''
+Write the game played on a game state (its move log) to an open text file. The result is taken from the game status
+unless it's given; SetUp and FEN tags are added when the game didn't start from the start position.
+'''
+def writeGame(f, gs, tags=None, result=None):
+    tags = dict(tags or {})
+    startFen, moves = sanMoves(gs)
+    if startFen != ChessEngine.START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = startFen
+    if result is None:
+        status = gs.gameStatus()
+        if status == ChessEngine.STATUS_CHECKMATE:
+            result = '0-1' if gs.whiteToMove else '1-0'
+        elif status in ChessEngine.DRAW_STATUSES:
+            result = '1/2-1/2'
+        else:
+            result = '*'
+    f.write(formatGame(tags, moves, result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read every game of a PGN file and check its moves.')
+    parser.add_argument('file', help='PGN file')
+    parser.add_argument('--tags-only', action='store_true', help="only read the tags, don't play the moves")
+    args = parser.parse_args()
+    games = 0
+    moves = 0
+    errors = 0
+    start = time.perf_counter()
+    for game in readGames(args.file, not args.tags_only):
+        games += 1
+        moves += len(game.moves)
+        if game.error is not None:
+            errors += 1
+            print('game %d (%s - %s): %s' % (games, game.tags.get('White', '?'), game.tags.get('Black', '?'), game.error))
+    elapsed = time.perf_counter() - start
+    print('%d games, %d moves, %d errors in %.3fs (%.1f games/sec, %d moves/sec)' % (games, moves, errors, elapsed,
+          games / elapsed if elapsed > 0 else 0, moves / elapsed if elapsed > 0 else 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Lazy SMP: a search on several cores. Python threads can't search in parallel, so worker processes all run the normal
+SmartMoveFinder search of the same root position. They don't split the tree between them; they share one transposition
+table (TranspositionTable.SharedTranspositionTable, in shared memory and without locks), so what one worker has already
+searched the others get from the table. The workers are kept slightly apart so they don't all search the same moves in
+the same order: every odd one goes one ply deeper, and every one but the first adds some noise to its history table.
+
+The first worker searches with the given limits. Once it's done the others are stopped, and the result of the deepest
+completed search is used.
+
+python ParallelSearch.py --depth 5 --workers 1 2 4 8   (time to depth on a few positions for every number of workers)
+"""
+import argparse
+import collections
+import multiprocessing
+import random
+import time
+
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+import TranspositionTable
+
+HISTORY_NOISE = 16 # at most this much is added to every history entry of a helper worker, enough to reorder ties
+
+# a few positions for the time to depth benchmark
+BENCHMARK_POSITIONS = [
+    ChessEngine.START_FEN,
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+    '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+]
+
+# result of one worker: best move (packed, 0 for none), completed depth, score and nodes searched
+WorkerResult = collections.namedtuple('WorkerResult', 'worker move depth score nodes')
+
+'''
+Body of a worker process: attach to the shared table and search every position sent to it until it gets None
+'''
+def workerLoop(index, tableName, sizeMB, stopSignal, tasks, results):
+    searcher = SmartMoveFinder.Searcher(TranspositionTable.SharedTranspositionTable(sizeMB, tableName), stopSignal=stopSignal)
+    rng = random.Random(index)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        searchId, gameClass, fen, codes, depth, timeLimit, maxNodes, clear = task
+        if clear:
+            searcher.moveOrderer.clear()
+        gs = gameClass.fromFEN(fen)
+        for code in codes:
+            gs.makeMoveCode(code)
+        if index > 0:
+            depth = min(depth + index % 2, SmartMoveFinder.MAX_DEPTH)
+            for table in searcher.moveOrderer.history.values():
+                for sq in range(64):
+                    table[sq] += rng.randrange(HISTORY_NOISE)
+        move = searcher.findBestMove(gs, gs.getValidMoves(), depth, timeLimit=timeLimit, maxNodes=maxNodes)
+        results.put((searchId, WorkerResult(index, move.code if move is not None else 0, searcher.completedDepth,
+                                            searcher.bestScore, searcher.nodes)))
+    searcher.transpositionTable.close()
+
+
+class ParallelSearch():
+    def __init__(self, workers, hashMB=16):
+        self.workers = workers
+        self.table = TranspositionTable.SharedTranspositionTable(hashMB)
+        self.stopSignal = multiprocessing.RawValue('b', 0)
+        self.results = multiprocessing.Queue()
+        self.tasks = []
+        self.processes = []
+        for index in range(workers):
+            tasks = multiprocessing.Queue()
+            process = multiprocessing.Process(target=workerLoop, daemon=True, args=(index, self.table.name,
+                                              hashMB, self.stopSignal, tasks, self.results))
+            process.start()
+            self.tasks.append(tasks)
+            self.processes.append(process)
+        self.searchId = 0
+        self.clearPending = False
+        # what the last search did, like a SmartMoveFinder.Searcher
+        self.completedDepth = 0
+        self.bestScore = 0
+        self.nodes = 0
+        self.workerResults = []
+
+    '''
+    Forget everything learned: the shared table now, the workers' move ordering at their next search
+    '''
+    def clear(self):
+        self.table.clear()
+        self.clearPending = True
+
+    '''
+    Search the position on every worker with the first worker's limits, returns the best Move of validMoves (None if
+    there are none). Blocks until the first worker is done and the others have stopped.
+    '''
+    def findBestMove(self, gs, validMoves, depth=SmartMoveFinder.DEPTH, timeLimit=None, maxNodes=None):
+        if len(validMoves) == 0:
+            return None
+        self.searchId += 1
+        self.table.newSearch()
+        self.stopSignal.value = 0
+        fen, codes = gs.gameHistory() # workers rebuild the game with its history, for repetitions
+        for tasks in self.tasks:
+            tasks.put((self.searchId, type(gs), fen, codes, depth, timeLimit, maxNodes, self.clearPending))
+        self.clearPending = False
+        results = {}
+        while len(results) < self.workers:
+            searchId, result = self.results.get()
+            if searchId != self.searchId:
+                continue
+            results[result.worker] = result
+            if result.worker == 0:
+                self.stopSignal.value = 1 # the helpers only support the first worker
+        self.workerResults = [results[index] for index in range(self.workers)]
+        best = results[0]
+        for result in self.workerResults:
+            if result.move != 0 and result.depth > best.depth:
+                best = result
+        self.completedDepth = best.depth
+        self.bestScore = best.score
+        self.nodes = sum(result.nodes for result in self.workerResults)
+        for move in validMoves:
+            if move.code == best.move:
+                return move
+        return None
+
+    '''
+    End the running search early (from another thread), findBestMove still returns the best move found so far
+    '''
+    def stop(self):
+        self.stopSignal.value = 1
+
+    def close(self):
+        for tasks in self.tasks:
+            tasks.put(None)
+        for process in self.processes:
+            process.join()
+        self.table.close()
+
+
+'''
+Time for every number of workers to complete depth on each benchmark position, starting from empty tables, and the
+speedup over one worker
+'''
+def runTimeToDepth(workerCounts, depth, hashMB):
+    baseline = None
+    for workers in workerCounts:
+        search = ParallelSearch(workers, hashMB)
+        total = 0.0
+        nodes = 0
+        for fen in BENCHMARK_POSITIONS:
+            gs = BitboardEngine.BitboardGameState.fromFEN(fen)
+            search.clear()
+            start = time.perf_counter()
+            search.findBestMove(gs, gs.getValidMoves(), depth)
+            total += time.perf_counter() - start
+            nodes += search.nodes
+        search.close()
+        if baseline is None:
+            baseline = total
+        print('%2d workers: depth %d on %d positions in %7.3fs  %9d nodes  %8d nodes/sec  speedup %.2fx' % (workers, depth,
+              len(BENCHMARK_POSITIONS), total, nodes, nodes / total if total > 0 else 0, baseline / total if total > 0 else 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to depth of the Lazy SMP search for several numbers of workers.')
+    parser.add_argument('--depth', type=int, default=4, help='depth every search has to complete (default: 4)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='worker counts to compare (default: 1 2 4 8)')
+    parser.add_argument('--hash', type=int, default=64, help='shared transposition table size in MB (default: 64)')
+    args = parser.parse_args()
+    print('%d cores' % multiprocessing.cpu_count())
+    runTimeToDepth(args.workers, args.depth, args.hash)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import pygame as p
-import PawnPromotionEngine, ChessEngine, SmartMoveFinder, ChessMain
+import PawnPromotionEngine, SmartMoveFinder
 
 
 WIDTH = HEIGHT = 512
@@ -15,13 +15,15 @@ def loadImages():
     # NOTE: we can access an image by saying 'IMAGES['wP']'
     
     
-def main():
+'''
+Ask for the piece a pawn promotes to, returns 'Q', 'R', 'B' or 'N'
+'''
+def main(whiteToMove=True):
     p.init()
     screen1 = p.display.set_mode((WIDTH, HEIGHT))
     clock = p.time.Clock()
     screen1.fill(p.Color("white"))
     ps = PawnPromotionEngine.PromotionState()
-    gs = ChessEngine.GameState()
     
     loadImages()
     
@@ -29,8 +31,8 @@ def main():
     playerTwo = False # Same as above but for black
     running = True
     while running:
-        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
-        if gs.whiteToMove:
+        humanTurn = (whiteToMove and playerOne) or (not whiteToMove and playerTwo)
+        if whiteToMove:
             allyColor = 'w'
         else:
             allyColor = 'b'
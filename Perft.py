@@ -0,0 +1,203 @@
+"""
+Perft (performance test) for the chess engine. It counts every leaf of the legal move tree to a given depth, which both
+checks getValidMoves/makeMove/undoMove against known node counts and measures how fast positions are generated.
+
+python Perft.py --depth 4                                   (start position, node count per root move)
+python Perft.py --fen "<fen>" --depth 3 --backend bitboard  (any position, on the bitboard backend)
+python Perft.py --suite --max-depth 3                       (standard positions, checked against the expected counts)
+python Perft.py --benchmark-moves --depth 3                 (packed moves against Move objects: speed and allocations)
+python Perft.py --benchmark-attacks                         (incremental attack maps against scanning the board)
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+
+import ChessEngine
+import EPD
+
+START_FEN = ChessEngine.START_FEN
+
+
+# (name, fen, {depth: expected node count})
+PERFT_SUITE = [
+    ('start position', START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ('en-passant and pins', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ('promotions and castling', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ('promotion with check', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     {1: 46, 2: 2079, 3: 89890}),
+    ('illegal en-passant (rank pin)', '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1', {6: 1134888}),
+    ('illegal en-passant (diagonal pin)', '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1', {6: 1015133}),
+    ('en-passant gives check', '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1', {6: 1440467}),
+    ('short castle gives check', '5k2/8/8/8/8/8/8/4K2R w K - 0 1', {6: 661072}),
+    ('long castle gives check', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1', {6: 803711}),
+    ('castling rights', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1', {4: 1274206}),
+    ('castling prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', {4: 1720476}),
+    ('promote out of check', '2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1', {6: 3821001}),
+    ('discovered check', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1', {5: 1004658}),
+    ('promote to give check', '4k3/1P6/8/8/8/8/K7/8 w - - 0 1', {6: 217342}),
+    ('underpromote to give check', '8/P1k5/K7/8/8/8/8/8 w - - 0 1', {6: 92683}),
+    ('self stalemate', 'K1k5/8/P7/8/8/8/8/8 w - - 0 1', {6: 2217}),
+    ('stalemate and checkmate', '8/k1P5/8/1K6/8/8/8/8 w - - 0 1', {7: 567584}),
+    ('stalemate and checkmate 2', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1', {4: 23527}),
+]
+
+# king-heavy and castling-heavy positions, where legality checks ask the most "is this square attacked" questions
+# (name, fen, depth)
+ATTACK_BENCHMARK = [
+    ('start position', START_FEN, 4),
+    ('kiwipete', PERFT_SUITE[1][1], 3),
+    ('castling rights', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1', 3),
+    ('castling prevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', 3),
+    ('discovered check', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1', 4),
+    ('queen and knight against king', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1', 4),
+]
+
+
+def perft(gs, depth):
+    moves = gs.getValidMoveCodes()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMoveCode(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMoveCode()
+    return nodes
+
+
+'''
+Perft through the Move object API (getValidMoves/makeMove/undoMove) instead of packed moves
+'''
+def perftMoveObjects(gs, depth):
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perftMoveObjects(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+'''
+Perft split by root move, returns a list of (notation, node count)
+'''
+def divide(gs, depth):
+    results = []
+    for move in gs.getValidMoveCodes():
+        gs.makeMoveCode(move)
+        nodes = perft(gs, depth - 1) if depth > 1 else 1
+        gs.undoMoveCode()
+        results.append((ChessEngine.moveNotation(move), nodes))
+    return results
+
+
+def runDivide(fen, depth, backend, checkHash=False):
+    gs = EPD.BACKENDS[backend].fromFEN(fen)
+    gs.debugIncremental = checkHash
+    start = time.perf_counter()
+    results = divide(gs, depth)
+    elapsed = time.perf_counter() - start
+    total = 0
+    for notation, nodes in sorted(results):
+        print(notation + ': ' + str(nodes))
+        total += nodes
+    print()
+    print('Moves: ' + str(len(results)))
+    print('Nodes: ' + str(total))
+    print('Time: %.3fs (%d nodes/sec)' % (elapsed, total / elapsed if elapsed > 0 else 0))
+
+
+'''
+Run every suite position up to maxDepth, returns True when all node counts match
+'''
+def runSuite(maxDepth, backend, checkHash=False):
+    allPassed = True
+    totalNodes = 0
+    totalTime = 0.0
+    for name, fen, expected in PERFT_SUITE:
+        for depth, expectedNodes in sorted(expected.items()):
+            if depth > maxDepth:
+                continue
+            gs = EPD.BACKENDS[backend].fromFEN(fen)
+            gs.debugIncremental = checkHash
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed = time.perf_counter() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            passed = nodes == expectedNodes
+            allPassed = allPassed and passed
+            print('%-4s %-34s depth %d: %9d nodes (expected %9d) %8.3fs' % ('ok' if passed else 'FAIL', name, depth, nodes, expectedNodes, elapsed))
+    if totalTime > 0:
+        print('Total: %d nodes in %.3fs (%d nodes/sec)' % (totalNodes, totalTime, totalNodes / totalTime))
+    return allPassed
+
+
+'''
+Run the same perft with Move objects and with packed moves, and report time, peak memory and Move objects allocated.
+Every move generated on the way to depth is built once, so the Move path allocates perft(1) + ... + perft(depth) objects.
+'''
+def runMoveBenchmark(fen, depth, backend):
+    gs = EPD.BACKENDS[backend].fromFEN(fen)
+    movesBuilt = sum(perft(gs, d) for d in range(1, depth + 1))
+    for name, perftFunction, allocated in (('Move objects', perftMoveObjects, movesBuilt), ('packed moves', perft, 0)):
+        gs = EPD.BACKENDS[backend].fromFEN(fen)
+        start = time.perf_counter()
+        nodes = perftFunction(gs, depth)
+        elapsed = time.perf_counter() - start
+        # second run with allocation tracing, which is too slow to time
+        tracemalloc.start()
+        perftFunction(gs, depth)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('%-13s %9d nodes %8.3fs %9d nodes/sec %9d Move objects built %8.1f KB peak' % (name, nodes, elapsed, nodes / elapsed, allocated, peak / 1024))
+
+
+'''
+Perft on the string backend with the attack maps kept up to date by makeMoveCode/undoMoveCode and with squares checked
+by scanning the board
+'''
+def runAttackBenchmark():
+    for name, fen, depth in ATTACK_BENCHMARK:
+        times = []
+        for gameClass in (ChessEngine.GameState, ChessEngine.AttackMapGameState):
+            gs = gameClass.fromFEN(fen)
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            times.append(time.perf_counter() - start)
+        print('%-30s depth %d: %8d nodes  scan %7.3fs  attack maps %7.3fs  (%.2fx)' % (name, depth, nodes, times[0], times[1], times[0] / times[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count the leaf nodes of the legal move tree of a position.')
+    parser.add_argument('--fen', default=START_FEN, help='position to search (default: start position)')
+    parser.add_argument('--depth', type=int, default=3, help='depth in plies (default: 3)')
+    parser.add_argument('--backend', choices=sorted(EPD.BACKENDS), default='string', help='GameState implementation to use')
+    parser.add_argument('--suite', action='store_true', help='run the standard perft positions instead of --fen')
+    parser.add_argument('--max-depth', type=int, default=4, help='deepest suite entry to run (default: 4)')
+    parser.add_argument('--check-hash', action='store_true', help='verify the incremental Zobrist key, evaluation scores, attack maps (attackmaps backend) and bitboards (bitboard backend) after every move (slow)')
+    parser.add_argument('--benchmark-moves', action='store_true', help='compare Move objects with packed moves on --fen')
+    parser.add_argument('--benchmark-attacks', action='store_true', help='compare incremental attack maps with board scans')
+    args = parser.parse_args()
+    if args.benchmark_attacks:
+        runAttackBenchmark()
+        return
+    if args.benchmark_moves:
+        runMoveBenchmark(args.fen, args.depth, args.backend)
+        return
+    if args.suite:
+        sys.exit(0 if runSuite(args.max_depth, args.backend, args.check_hash) else 1)
+    runDivide(args.fen, args.depth, args.backend, args.check_hash)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,19 @@
 import random
+import time
+import TranspositionTable
+import MoveOrdering
+import Evaluation
+from TranspositionTable import EXACT, LOWER_BOUND, UPPER_BOUND
+from ChessEngine import PROMOTION_MOVE, FIFTY_MOVE_PLIES
 
-
-
+CHECKMATE = 100000
+STALEMATE = 0
+MATE_BOUND = CHECKMATE - 1000 # scores beyond this are mates, stored relative to the node in the transposition table
+DEPTH = 3
+MAX_DEPTH = 64 # iterative deepening limit when searching on a time or node budget
+CHECK_EVERY = 16 # nodes between two checks of the deadline
+MAX_QUIESCENCE_PLY = 16 # captures searched past the horizon at most, so a leaf costs a bounded number of nodes
+DELTA_MARGIN = 200 # a capture that can't bring the score within this of alpha isn't searched
 
 
 def findRandomMove(validMoves):
@@ -10,5 +22,249 @@ def findRandomMove(validMoves):
 def pawnPromotionRandom():
     return random.choice(['Q', 'R', 'N', 'B'])
 
-def findBestMove():
-    return
\ No newline at end of file
+'''
+A negamax alpha-beta search and everything it keeps while searching, so every thread or process that searches owns its
+own Searcher and stop only ends that one's search. The transposition table and the move orderer are what one search
+learns for the next: pass the same ones to a new Searcher to keep them (only one search may use them at a time). A
+stopped Searcher stays stopped, a search that may be stopped from another thread gets a Searcher of its own.
+After a search, nodes, completedDepth and bestScore describe what was searched; quiescenceNodes of those nodes were
+searched by the quiescence search below leafNodes horizon leaves. stopSignal, when set, is a shared value another
+process sets to non-zero to end the search (see ParallelSearch.py).
+'''
+class Searcher():
+    def __init__(self, tt=None, moveOrderer=None, stopSignal=None):
+        self.transpositionTable = tt if tt is not None else TranspositionTable.TranspositionTable(16)
+        self.moveOrderer = moveOrderer if moveOrderer is not None else MoveOrdering.MoveOrderer()
+        self.moveBuffers = [[] for _ in range(MoveOrdering.MAX_PLY)] # reused by the move generation of the search, one per ply
+        self.stopRequested = False # set by stop, from any thread
+        self.stopSignal = stopSignal
+        self.searchStopped = False
+        self.deadline = None
+        self.nodeLimit = None
+        self.nextMove = None
+        self.nodes = 0
+        self.quiescenceNodes = 0
+        self.leafNodes = 0
+        self.completedDepth = 0
+        self.bestScore = 0
+
+    '''
+    Forget everything learned: the transposition table and the move ordering
+    '''
+    def clear(self):
+        self.transpositionTable.clear()
+        self.moveOrderer.clear()
+
+    '''
+    Iterative deepening search, returns the best move (None if there are no valid moves). The search goes one ply deeper
+    at a time up to depth and stops as soon as timeLimit seconds have passed or maxNodes nodes have been searched,
+    returning the best move found so far. onIteration, when given, is called with (depth, score, nodes, best move code)
+    after every completed iteration.
+    '''
+    def findBestMove(self, gs, validMoves, depth=DEPTH, timeLimit=None, maxNodes=None, onIteration=None):
+        if len(validMoves) == 0:
+            return None
+        tt = self.transpositionTable
+        tt.newSearch()
+        self.moveOrderer.newSearch()
+        self.deadline = time.perf_counter() + timeLimit if timeLimit is not None else None
+        self.nodeLimit = maxNodes
+        self.searchStopped = False
+        self.nodes = 0
+        self.quiescenceNodes = 0
+        self.leafNodes = 0
+        self.completedDepth = 0
+        self.bestScore = 0
+        moveCodes = gs.getValidMoveCodes() # the search works on packed moves, validMoves is only used to return a Move
+        bestMove = moveCodes[0] # something to play even if the first iteration can't finish
+        turnMultiplier = 1 if gs.whiteToMove else -1
+        for currentDepth in range(1, depth + 1):
+            self.nextMove = None
+            score = self.findMoveNegaMaxAlphaBeta(gs, moveCodes, currentDepth, -CHECKMATE, CHECKMATE, turnMultiplier, 0, tt)
+            if self.nextMove is not None: # root moves of an interrupted iteration were fully searched, so they can be used
+                bestMove = self.nextMove
+            if self.searchStopped:
+                break
+            self.completedDepth = currentDepth
+            self.bestScore = score
+            if onIteration is not None:
+                onIteration(currentDepth, score, self.nodes, bestMove)
+            if abs(score) > MATE_BOUND: # a forced mate was found, deeper searches won't change it
+                break
+        for move in validMoves:
+            if move.code == bestMove:
+                return move
+        return None
+
+    '''
+    Make the running search stop at its next node, it still returns the best move found so far. A search started later
+    by this Searcher stops at once.
+    '''
+    def stop(self):
+        self.stopRequested = True
+
+    '''
+    Stop the search once the deadline or the node budget is reached, or when stop or the stopSignal asked for it
+    '''
+    def checkLimits(self):
+        if self.stopRequested:
+            self.searchStopped = True
+        elif self.nodeLimit is not None and self.nodes >= self.nodeLimit:
+            self.searchStopped = True
+        elif self.nodes % CHECK_EVERY == 0 and ((self.deadline is not None and time.perf_counter() >= self.deadline) or
+                                                (self.stopSignal is not None and self.stopSignal.value)):
+            self.searchStopped = True
+
+    def findMoveNegaMaxAlphaBeta(self, gs, validMoves, depth, alpha, beta, turnMultiplier, ply, tt):
+        if ply > 0 and isDrawByRule(gs):
+            return STALEMATE
+        if depth == 0:
+            self.leafNodes += 1
+            return self.quiescence(gs, alpha, beta, turnMultiplier, ply, 0)
+        self.nodes += 1
+        self.checkLimits()
+        if self.searchStopped:
+            return 0
+        alphaOriginal = alpha
+        key = gs.zobristKey
+        hashMove = 0
+        entry = tt.probe(key)
+        if entry is not None:
+            entryDepth, entryScore, bound, hashMove = entry
+            if ply > 0 and entryDepth >= depth:
+                score = scoreFromTable(entryScore, ply)
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or (bound == UPPER_BOUND and score <= alpha):
+                    return score
+
+        if validMoves is None: # generated here rather than by the parent, so a draw or a table cutoff doesn't pay for it
+            validMoves = gs.generateMoves(self.moveBuffers[ply], True, True)
+        if len(validMoves) == 0:
+            return -CHECKMATE + ply if gs.inCheck else STALEMATE
+        if gs.isInsufficientMaterial():
+            return STALEMATE
+
+        maxScore = -CHECKMATE
+        bestMove = None
+        moveOrderer = self.moveOrderer
+        for move in moveOrderer.orderedMoves(validMoves, gs.board, ply, hashMove):
+            gs.makeMoveCode(move)
+            score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier, ply + 1, tt)
+            gs.undoMoveCode()
+            if self.searchStopped: # the score of an interrupted subtree is meaningless
+                return 0
+            if score > maxScore:
+                maxScore = score
+                bestMove = move
+                if ply == 0:
+                    self.nextMove = move
+            if maxScore > alpha:
+                alpha = maxScore
+            if alpha >= beta:
+                if MoveOrdering.isQuiet(move, gs.board):
+                    moveOrderer.updateQuietCutoff(move, gs.board, ply, depth)
+                break
+
+        if maxScore <= alphaOriginal:
+            bound = UPPER_BOUND
+        elif maxScore >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        tt.store(key, depth, scoreToTable(maxScore, ply), bound, bestMove if bestMove is not None else 0)
+        return maxScore
+
+    '''
+    Search only captures and promotions from a horizon leaf until the position is quiet, so the score isn't taken in the
+    middle of an exchange. The side to move can stand pat on the static evaluation; captures that can't raise alpha even
+    when winning the piece outright (delta pruning) or that lose material by static exchange are skipped. In check every
+    evasion is searched since standing pat isn't an option.
+    Only captures are generated. At the horizon itself a position without captures is checked for stalemate, deeper down
+    it just stands pat.
+    '''
+    def quiescence(self, gs, alpha, beta, turnMultiplier, ply, quiescencePly):
+        self.nodes += 1
+        self.quiescenceNodes += 1
+        self.checkLimits()
+        if self.searchStopped:
+            return 0
+        inCheck = gs.kingInCheck()
+        if inCheck:
+            validMoves = gs.generateEvasions(self.moveBuffers[ply])
+            if len(validMoves) == 0:
+                return -CHECKMATE + ply
+        else:
+            validMoves = gs.generateCaptures(self.moveBuffers[ply])
+            if len(validMoves) == 0 and quiescencePly == 0 and not gs.hasLegalMove():
+                return STALEMATE
+        standPat = turnMultiplier * Evaluation.evaluate(gs)
+        if quiescencePly >= MAX_QUIESCENCE_PLY:
+            return standPat
+        if inCheck:
+            maxScore = -CHECKMATE
+        else:
+            if standPat >= beta:
+                return standPat
+            maxScore = standPat
+            if standPat > alpha:
+                alpha = standPat
+        board = gs.board
+        for move in self.moveOrderer.orderedMoves(validMoves, board, ply):
+            if not inCheck:
+                endSq = (move >> 6) & 63
+                captured = board[endSq >> 3][endSq & 7]
+                if (move >> 12) & 3 != PROMOTION_MOVE and \
+                        standPat + MoveOrdering.SEE_VALUES[captured[1] if captured != '--' else 'P'] + DELTA_MARGIN <= alpha:
+                    continue
+                if MoveOrdering.staticExchange(board, move) < 0:
+                    continue
+            gs.makeMoveCode(move)
+            score = -self.quiescence(gs, -beta, -alpha, -turnMultiplier, ply + 1, quiescencePly + 1)
+            gs.undoMoveCode()
+            if self.searchStopped:
+                return 0
+            if score > maxScore:
+                maxScore = score
+            if maxScore > alpha:
+                alpha = maxScore
+            if alpha >= beta:
+                break
+        return maxScore
+
+'''
+A position already reached earlier in the game or the search is scored as a draw (a second repetition would be a
+threefold one, and playing into it can't be better than the first time), as is one past the fifty-move rule unless it's
+checkmate. Captures and pawn moves reset the halfmove clock, so the quiescence search never needs this.
+'''
+def isDrawByRule(gs):
+    if gs.halfmoveClock >= FIFTY_MOVE_PLIES:
+        return not gs.isCheckmate()
+    return gs.repetitions() > 0
+
+'''
+Mate scores count plies from the root, the table stores them counted from the node itself so they stay valid when the
+same position is reached at another ply
+'''
+def scoreToTable(score, ply):
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+'''
+Score as text from the side to move: centipawns, or mate in moves (negative when getting mated)
+'''
+def formatScore(score):
+    if score is None:
+        return '-'
+    if abs(score) > MATE_BOUND:
+        plies = CHECKMATE - abs(score)
+        return 'mate ' + str((plies + 1) // 2 if score > 0 else -((plies + 1) // 2))
+    return 'cp ' + str(score)
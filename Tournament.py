@@ -0,0 +1,247 @@
+"""
+Engine against engine matches without the GUI. Two engine settings play a number of games on a pool of worker processes,
+each game starting from an opening position and every opening played twice with the colors swapped. The games are
+written as PGN while they finish and a summary is printed at the end: wins, draws and losses of the first engine, the
+Elo difference with a 95% error margin and the nodes per second of each engine.
+
+python Tournament.py depth=3 random --games 100                          (search against random moves)
+python Tournament.py time=0.1 depth=2 --games 2000 --pgn match.pgn       (a tenth of a second per move against depth 2)
+python Tournament.py depth=4,nodes=20000 depth=3 --openings openings.epd  (openings from a FEN or EPD file)
+
+An engine is either 'random' or a comma separated list of depth=<plies>, time=<seconds per move> and nodes=<per move>.
+"""
+import argparse
+import collections
+import datetime
+import math
+import os
+import random
+import sys
+import time
+
+import ChessEngine
+import SmartMoveFinder
+import TranspositionTable
+import PGN
+import EPD
+
+MAX_PLIES = 400 # a game still going after this many plies is adjudicated a draw
+ADJUDICATION = 'adjudication' # termination of those games, the others end with a game status
+
+# a few common openings a handful of plies deep, so that games between deterministic engines differ
+OPENINGS = [
+    ChessEngine.START_FEN,
+    'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2', # open game
+    'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2', # sicilian
+    'rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2', # french
+    'rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2', # caro-kann
+    'rnbqkbnr/ppp1pppp/8/3p4/2PP4/8/PP2PPPP/RNBQKBNR b KQkq - 0 2', # queen's gambit
+    'rnbqkb1r/pppppp1p/5np1/8/2PP4/8/PP2PPPP/RNBQKBNR w KQkq - 0 3', # king's indian
+    'rnbqkbnr/pppppppp/8/8/2P5/8/PP1PPPPP/RNBQKBNR b KQkq - 0 1', # english
+]
+
+# how an engine picks its moves: random ones, or a search with any of the three limits (None for no limit)
+EngineSettings = collections.namedtuple('EngineSettings', 'name random depth time nodes')
+
+# (game index, white engine index, opening fen, opening id, SAN moves, result, termination, engine nodes, engine seconds)
+# termination is the game status that ended the game or ADJUDICATION, engine nodes and seconds are indexed by engine,
+# not by color
+GameResult = collections.namedtuple('GameResult', 'index white fen openingId moves result termination nodes time')
+
+'''
+Parse an engine description like 'random' or 'depth=4,time=0.5', raises ValueError when it can't be understood
+'''
+def parseEngine(text):
+    if text == 'random':
+        return EngineSettings(text, True, None, None, None)
+    limits = {'depth': None, 'time': None, 'nodes': None}
+    for part in text.split(','):
+        name, _, value = part.partition('=')
+        if name not in limits or not value:
+            raise ValueError('unknown engine setting: ' + part)
+        limits[name] = float(value) if name == 'time' else int(value)
+    depth = limits['depth']
+    if depth is None:
+        depth = SmartMoveFinder.MAX_DEPTH if limits['time'] is not None or limits['nodes'] is not None else SmartMoveFinder.DEPTH
+    return EngineSettings(text, False, depth, limits['time'], limits['nodes'])
+
+
+# settings and searchers of a worker process, built once by setupWorker. There is a searcher per engine, so neither gets
+# the other's table entries or move ordering.
+Worker = collections.namedtuple('Worker', 'backend engines maxPlies searchers')
+
+'''
+Runs once in every worker process
+'''
+def setupWorker(backend, engines, hashMB, maxPlies):
+    return Worker(EPD.BACKENDS[backend], engines, maxPlies,
+                  [SmartMoveFinder.Searcher(TranspositionTable.TranspositionTable(hashMB)) for _ in engines])
+
+
+'''
+Play one game in the worker. The tables are cleared first so a game doesn't depend on the games the same worker played
+before, and random moves are seeded by the game index so a match can be replayed.
+'''
+def playGame(worker, task):
+    index, white, fen, openingId, seed = task
+    random.seed(seed + index)
+    for searcher in worker.searchers:
+        searcher.clear()
+    gs = worker.backend.fromFEN(fen)
+    fen = gs.toFEN() # an EPD opening has no move counters, the PGN FEN tag needs all six fields
+    moves = []
+    nodes = [0, 0]
+    seconds = [0.0, 0.0]
+    while True:
+        status = gs.gameStatus()
+        if status != ChessEngine.STATUS_ONGOING:
+            break
+        if len(moves) >= worker.maxPlies:
+            status = ADJUDICATION
+            break
+        engine = white if gs.whiteToMove else 1 - white
+        settings = worker.engines[engine]
+        validMoves = gs.getValidMoves()
+        start = time.perf_counter()
+        if settings.random:
+            move = SmartMoveFinder.findRandomMove(validMoves)
+        else:
+            searcher = worker.searchers[engine]
+            move = searcher.findBestMove(gs, validMoves, settings.depth, timeLimit=settings.time, maxNodes=settings.nodes)
+            nodes[engine] += searcher.nodes
+        seconds[engine] += time.perf_counter() - start
+        moves.append(gs.sanNotation(move.code, [validMove.code for validMove in validMoves]))
+        gs.makeMoveCode(move.code)
+    if status == ChessEngine.STATUS_CHECKMATE:
+        result = '0-1' if gs.whiteToMove else '1-0'
+    else:
+        result = '1/2-1/2'
+    return GameResult(index, white, fen, openingId, moves, result, status, nodes, seconds)
+
+
+'''
+Play games games between two EngineSettings on a pool of worker processes and yield a GameResult for each of them as
+soon as it's done. Game i starts from opening i // 2 (openings are (fen, id) pairs, used again from the first one when
+there are fewer than games // 2) and the first engine has white in the even games.
+'''
+def playMatch(engines, games, openings, workers=None, backend='bitboard', hashMB=16, maxPlies=MAX_PLIES, seed=0, maxPending=None):
+    tasks = ((index, index % 2) + openings[(index // 2) % len(openings)] + (seed,) for index in range(games))
+    return EPD.runOnPool(playGame, tasks, setupWorker, (backend, engines, hashMB, maxPlies), workers, False, maxPending)
+
+
+'''
+PGN text of a game. The Termination tag only has the values PGN allows (normal or adjudication here), the status that
+ended the game is written as a comment after the last move.
+'''
+def formatPGN(game, engines, event, date):
+    tags = {'Event': event, 'Date': date, 'Round': str(game.index + 1), 'White': engines[game.white].name,
+            'Black': engines[1 - game.white].name}
+    if game.fen != ChessEngine.START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = game.fen
+    if game.openingId:
+        tags['Opening'] = game.openingId
+    tags['PlyCount'] = str(len(game.moves))
+    tags['Termination'] = ADJUDICATION if game.termination == ADJUDICATION else 'normal'
+    return PGN.formatGame(tags, game.moves, game.result, game.termination)
+
+
+'''
+Score of the first engine in one game: 1 for a win, 0.5 for a draw, 0 for a loss
+'''
+def gameScore(game):
+    if game.result == '1/2-1/2':
+        return 0.5
+    return 1.0 if (game.result == '1-0') == (game.white == 0) else 0.0
+
+
+'''
+Elo difference that gives an expected score (between 0 and 1, exclusive)
+'''
+def eloDifference(score):
+    return -400 * math.log10(1 / score - 1)
+
+
+'''
+Elo difference of the first engine and the 95% margin around it, from the spread of the game scores. Returns None for
+the difference when one engine scored every point, and None for the margin when it can't be told.
+'''
+def eloEstimate(scores):
+    n = len(scores)
+    mean = sum(scores) / n
+    if mean <= 0 or mean >= 1:
+        return None, None
+    deviation = math.sqrt(sum((score - mean) ** 2 for score in scores) / n)
+    spread = 1.96 * deviation / math.sqrt(n)
+    if mean - spread <= 0 or mean + spread >= 1:
+        return eloDifference(mean), None
+    return eloDifference(mean), (eloDifference(mean + spread) - eloDifference(mean - spread)) / 2
+
+
+def formatSummary(engines, games, elapsed):
+    scores = [gameScore(game) for game in games]
+    wins = scores.count(1.0)
+    draws = scores.count(0.5)
+    losses = scores.count(0.0)
+    lines = ['%s vs %s: %d games in %.1fs' % (engines[0].name, engines[1].name, len(games), elapsed),
+             'W/D/L %d/%d/%d, score %.1f/%d (%.1f%%)' % (wins, draws, losses, sum(scores), len(games), 100 * sum(scores) / len(games))]
+    elo, margin = eloEstimate(scores)
+    if elo is None:
+        lines.append('Elo difference: not measurable, one engine scored every point')
+    else:
+        lines.append('Elo difference: %+.1f %s' % (elo, '+/- %.1f' % margin if margin is not None else '(margin unknown)'))
+    for engine in (0, 1):
+        nodes = sum(game.nodes[engine] for game in games)
+        seconds = sum(game.time[engine] for game in games)
+        if nodes:
+            lines.append('%s: %d nodes in %.1fs (%d nodes/sec)' % (engines[engine].name, nodes, seconds, nodes / seconds if seconds > 0 else 0))
+    terminations = collections.Counter(game.termination for game in games)
+    lines.append('Terminations: ' + ', '.join('%s %d' % item for item in terminations.most_common()))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play games between two engine settings on a pool of processes.')
+    parser.add_argument('engine1', help="first engine: 'random' or e.g. depth=3,time=0.5,nodes=10000")
+    parser.add_argument('engine2', help='second engine')
+    parser.add_argument('--games', type=int, default=100, help='games to play (default: 100)')
+    parser.add_argument('--openings', help='FEN or EPD file of opening positions (default: a few built-in openings)')
+    parser.add_argument('--pgn', help='write the games to this PGN file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='worker processes (default: one per core)')
+    parser.add_argument('--backend', choices=sorted(EPD.BACKENDS), default='bitboard', help='GameState implementation to use')
+    parser.add_argument('--hash', type=int, default=16, help='transposition table size per engine and worker in MB (default: 16)')
+    parser.add_argument('--max-plies', type=int, default=MAX_PLIES, help='adjudicate a draw after this many plies (default: %d)' % MAX_PLIES)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random moves (default: 0)')
+    args = parser.parse_args()
+    try:
+        engines = (parseEngine(args.engine1), parseEngine(args.engine2))
+    except ValueError as e:
+        parser.error(str(e))
+    if args.openings:
+        openings = [(fen, positionId) for index, fen, positionId in EPD.readPositions(args.openings)]
+        if not openings:
+            parser.error('no positions in ' + args.openings)
+    else:
+        openings = [(fen, '') for fen in OPENINGS]
+
+    pgn = open(args.pgn, 'w') if args.pgn else None
+    event = engines[0].name + ' vs ' + engines[1].name
+    date = datetime.date.today().strftime('%Y.%m.%d')
+    games = []
+    start = time.perf_counter()
+    try:
+        for game in playMatch(engines, args.games, openings, args.workers, args.backend, args.hash, args.max_plies, args.seed):
+            games.append(game)
+            if pgn is not None:
+                pgn.write(formatPGN(game, engines, event, date))
+            print('\rgame %d/%d' % (len(games), args.games), end='', file=sys.stderr)
+    finally:
+        if pgn is not None:
+            pgn.close()
+    print(file=sys.stderr)
+    if games:
+        print(formatSummary(engines, games, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
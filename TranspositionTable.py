@@ -0,0 +1,207 @@
+"""
+Fixed-size transposition table for the search. Results are stored by Zobrist key (GameState.zobristKey) so a position
+reached again through another move order costs one probe instead of a whole subtree.
+
+The table is preallocated as two flat arrays of unsigned 64-bit integers: one with the keys and one with the entry data
+packed into a single integer (see packEntry). Entries are grouped in buckets of two slots: the first slot keeps the
+deepest result (depth-preferred) and the second one is always replaced. Every search bumps the table age so entries left
+over from older searches can be overwritten even if they are deeper.
+
+SharedTranspositionTable keeps the same arrays in a multiprocessing.shared_memory block, so the processes of a parallel
+search (ParallelSearch.py) all read and write one table.
+"""
+from array import array
+from multiprocessing import shared_memory
+
+# bound types
+EXACT = 0
+LOWER_BOUND = 1 # the score is at least this (the search failed high)
+UPPER_BOUND = 2 # the score is at most this (the search failed low)
+
+ENTRY_BYTES = 16 # 8 bytes of key and 8 bytes of data
+BUCKET_SLOTS = 2
+
+# data layout: packed move (16 bits, see ChessEngine.encodeMove) | depth (8 bits) | bound (2 bits) | age (6 bits) | score + SCORE_OFFSET (32 bits)
+SCORE_OFFSET = 1 << 31
+MAX_AGE = 63
+HEADER_WORDS = 1 # the shared table starts with the search age
+
+'''
+Pack an entry in one 64-bit integer
+'''
+def packEntry(depth, score, bound, move, age):
+    return move | (depth << 16) | (bound << 24) | (age << 26) | ((score + SCORE_OFFSET) << 32)
+
+
+def unpackEntry(data):
+    return (data >> 16) & 0xFF, (data >> 32) - SCORE_OFFSET, (data >> 24) & 0x3, data & 0xFFFF
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB=16):
+        self.resize(sizeMB)
+
+    '''
+    Allocate the table, the number of buckets is rounded down to a power of two so the index is a mask of the key
+    '''
+    def resize(self, sizeMB):
+        buckets = max(1, (sizeMB * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SLOTS))
+        self.bucketCount = 1 << (buckets.bit_length() - 1)
+        self.bucketMask = self.bucketCount - 1
+        self.sizeMB = sizeMB
+        self.clear()
+
+    def clear(self):
+        slots = self.bucketCount * BUCKET_SLOTS
+        self.keys = array('Q', bytes(8 * slots))
+        self.data = array('Q', bytes(8 * slots))
+        self.age = 0
+
+    '''
+    Called at the start of every search so entries of the previous searches become replaceable
+    '''
+    def newSearch(self):
+        self.age = (self.age + 1) & MAX_AGE
+
+    '''
+    Returns (depth, score, bound, move) for the position with the given key, or None if it is not stored
+    '''
+    def probe(self, key):
+        slot = (key & self.bucketMask) * BUCKET_SLOTS
+        keys = self.keys
+        if keys[slot] == key and self.data[slot]:
+            return unpackEntry(self.data[slot])
+        if keys[slot + 1] == key and self.data[slot + 1]:
+            return unpackEntry(self.data[slot + 1])
+        return None
+
+    '''
+    Store a search result; move 0 means no best move is known
+    '''
+    def store(self, key, depth, score, bound, move):
+        slot = (key & self.bucketMask) * BUCKET_SLOTS
+        keys = self.keys
+        data = self.data
+        if keys[slot + 1] == key and keys[slot] != key:
+            slot += 1 # already in the always-replace slot, update it there
+        elif keys[slot] != key and data[slot]:
+            oldData = data[slot]
+            oldDepth = (oldData >> 16) & 0xFF
+            oldAge = (oldData >> 26) & MAX_AGE
+            if depth < oldDepth and oldAge == self.age:
+                slot += 1 # the depth-preferred slot keeps its deeper entry of this search
+        if move == 0 and keys[slot] == key and data[slot]:
+            move = data[slot] & 0xFFFF # keep the best move we already knew about
+        keys[slot] = key
+        data[slot] = packEntry(depth, score, bound, move, self.age)
+
+    '''
+    Permille of depth-preferred slots used by the current search (sampled on the first 1000 buckets)
+    '''
+    def hashfull(self):
+        sample = min(1000, self.bucketCount)
+        used = 0
+        for bucket in range(sample):
+            data = self.data[bucket * BUCKET_SLOTS]
+            if data and (data >> 26) & MAX_AGE == self.age:
+                used += 1
+        return used * 1000 // sample
+
+
+'''
+Transposition table in a shared memory block, used by every process of a parallel search without locks. A slot holds
+key ^ data instead of the key: two processes storing into the same slot at once can leave the key of one entry with the
+data of the other, and such a slot simply doesn't verify on probe and counts as empty.
+The process that creates the table owns it (clears, resizes and ages it, and frees the memory on close); the others
+attach to it by name with the same size. The age lives in the block, so newSearch in an attached process only reads it.
+'''
+class SharedTranspositionTable(TranspositionTable):
+    def __init__(self, sizeMB=16, name=None):
+        self.memory = None
+        self.owner = name is None
+        if self.owner:
+            self.resize(sizeMB)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name) # child processes share the owner's resource tracker
+            self.mapMemory(sizeMB)
+
+    @property
+    def name(self):
+        return self.memory.name
+
+    def resize(self, sizeMB):
+        self.close()
+        buckets = max(1, (sizeMB * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SLOTS))
+        slots = (1 << (buckets.bit_length() - 1)) * BUCKET_SLOTS
+        self.memory = shared_memory.SharedMemory(create=True, size=8 * (HEADER_WORDS + 2 * slots))
+        self.mapMemory(sizeMB)
+        self.clear()
+
+    '''
+    Views of the header, keys and data in the shared block
+    '''
+    def mapMemory(self, sizeMB):
+        buckets = max(1, (sizeMB * 1024 * 1024) // (ENTRY_BYTES * BUCKET_SLOTS))
+        self.bucketCount = 1 << (buckets.bit_length() - 1)
+        self.bucketMask = self.bucketCount - 1
+        self.sizeMB = sizeMB
+        slots = self.bucketCount * BUCKET_SLOTS
+        self.words = self.memory.buf.cast('Q')
+        self.header = self.words[:HEADER_WORDS]
+        self.keys = self.words[HEADER_WORDS:HEADER_WORDS + slots]
+        self.data = self.words[HEADER_WORDS + slots:HEADER_WORDS + 2 * slots]
+        self.age = self.header[0]
+
+    def clear(self):
+        self.memory.buf[:] = bytes(len(self.memory.buf))
+        self.age = 0
+
+    def newSearch(self):
+        if self.owner:
+            self.header[0] = (self.header[0] + 1) & MAX_AGE
+        self.age = self.header[0]
+
+    def probe(self, key):
+        slot = (key & self.bucketMask) * BUCKET_SLOTS
+        data = self.data[slot]
+        if data and self.keys[slot] ^ data == key:
+            return unpackEntry(data)
+        data = self.data[slot + 1]
+        if data and self.keys[slot + 1] ^ data == key:
+            return unpackEntry(data)
+        return None
+
+    def store(self, key, depth, score, bound, move):
+        slot = (key & self.bucketMask) * BUCKET_SLOTS
+        keys = self.keys
+        data = self.data
+        first = data[slot]
+        firstKey = keys[slot] ^ first
+        second = data[slot + 1]
+        if keys[slot + 1] ^ second == key and firstKey != key:
+            slot += 1 # already in the always-replace slot, update it there
+            old = second
+        else:
+            old = first
+            if firstKey != key and first:
+                if depth < (first >> 16) & 0xFF and (first >> 26) & MAX_AGE == self.age:
+                    slot += 1 # the depth-preferred slot keeps its deeper entry of this search
+                    old = second
+        if move == 0 and old and keys[slot] ^ old == key:
+            move = old & 0xFFFF # keep the best move we already knew about
+        entry = packEntry(depth, score, bound, move, self.age)
+        data[slot] = entry
+        keys[slot] = key ^ entry
+
+    '''
+    Let go of the shared block, the owner also frees it
+    '''
+    def close(self):
+        if self.memory is None:
+            return
+        for view in (self.header, self.keys, self.data, self.words):
+            view.release()
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+        self.memory = None
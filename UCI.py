@@ -0,0 +1,225 @@
+"""
+UCI (Universal Chess Interface) front-end, so the engine can be played by any UCI chess GUI or tournament manager:
+python UCI.py, then the GUI talks to it over standard input and output.
+
+The search runs on a background thread, so stop and isready are answered right away while it's thinking. Supported:
+uci, isready, ucinewgame, setoption (Hash, Threads), position startpos/fen ... moves ..., go with depth, movetime,
+nodes, wtime/btime/winc/binc/movestogo and infinite, stop and quit. With Threads above 1 the search runs on that many
+processes (ParallelSearch.py), and only reports once it's done.
+"""
+import sys
+import threading
+import time
+
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+import TranspositionTable
+import MoveOrdering
+import ParallelSearch
+
+ENGINE_NAME = 'Chess'
+MOVES_TO_GO = 30 # moves the remaining clock time is split over when the GUI doesn't say
+TIME_MARGIN = 0.05 # seconds kept back on every move for the GUI and the operating system
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+
+class UCIEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock() # the search thread and the command loop both write
+        self.gs = BitboardEngine.BitboardGameState()
+        self.transpositionTable = TranspositionTable.TranspositionTable()
+        self.moveOrderer = MoveOrdering.MoveOrderer()
+        self.searcher = None # SmartMoveFinder.Searcher of the running search, a new one for every go
+        self.searchThread = None
+        self.infinite = False # go infinite: bestmove is only sent after stop
+        self.stopped = threading.Event()
+        self.threads = 1
+        self.parallel = None # ParallelSearch of the last search with Threads > 1, kept for the next one
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    '''
+    Handle one command line, returns False on quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == 'uci':
+            self.send('id name ' + ENGINE_NAME)
+            self.send('id author ' + ENGINE_NAME + ' contributors')
+            self.send('option name Hash type spin default %d min 1 max %d' % (self.transpositionTable.sizeMB, MAX_HASH_MB))
+            self.send('option name Threads type spin default 1 min 1 max %d' % MAX_THREADS)
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            self.transpositionTable.clear()
+            self.moveOrderer.clear()
+            if self.parallel is not None:
+                self.parallel.clear()
+        elif command == 'setoption':
+            self.stopSearch()
+            self.setOption(tokens[1:])
+        elif command == 'position':
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == 'go':
+            self.stopSearch()
+            self.startSearch(tokens[1:])
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'quit':
+            return False
+        return True
+
+    '''
+    setoption name <name> value <value>, option names aren't case sensitive
+    '''
+    def setOption(self, tokens):
+        if 'name' not in tokens:
+            return
+        nameEnd = tokens.index('value') if 'value' in tokens else len(tokens)
+        name = ' '.join(tokens[tokens.index('name') + 1:nameEnd]).lower()
+        value = ' '.join(tokens[nameEnd + 1:])
+        try:
+            if name == 'hash':
+                sizeMB = min(max(int(value), 1), MAX_HASH_MB)
+                if sizeMB != self.transpositionTable.sizeMB:
+                    self.transpositionTable.resize(sizeMB)
+                    self.closeParallel() # started again with the new size
+            elif name == 'threads':
+                threads = min(max(int(value), 1), MAX_THREADS)
+                if threads != self.threads:
+                    self.threads = threads
+                    self.closeParallel()
+        except ValueError:
+            self.send('info string bad value for ' + name + ': ' + value)
+
+    '''
+    position startpos [moves ...] or position fen <fen> [moves ...], moves in coordinate notation (e2e4, e7e8q)
+    '''
+    def setPosition(self, tokens):
+        movesAt = tokens.index('moves') if 'moves' in tokens else len(tokens)
+        try:
+            if tokens and tokens[0] == 'fen':
+                self.gs.loadFEN(' '.join(tokens[1:movesAt]))
+            else:
+                self.gs.loadFEN(ChessEngine.START_FEN)
+        except ValueError as e:
+            self.send('info string bad position: ' + str(e))
+            return
+        for notation in tokens[movesAt + 1:]:
+            for code in self.gs.getValidMoveCodes():
+                if ChessEngine.moveNotation(code) == notation:
+                    self.gs.makeMoveCode(code)
+                    break
+            else:
+                self.send('info string illegal move: ' + notation)
+                return
+
+    '''
+    Start searching the current position on a background thread with the limits of a go command
+    '''
+    def startSearch(self, tokens):
+        limits = {}
+        i = 0
+        while i < len(tokens):
+            if tokens[i] in ('depth', 'movetime', 'nodes', 'wtime', 'btime', 'winc', 'binc', 'movestogo') and i + 1 < len(tokens):
+                try:
+                    limits[tokens[i]] = int(tokens[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                limits[tokens[i]] = True
+                i += 1
+        self.infinite = 'infinite' in limits
+        timeLimit = None
+        if 'movetime' in limits:
+            timeLimit = max(limits['movetime'] / 1000 - TIME_MARGIN, 0.01)
+        elif not self.infinite:
+            clock, increment = ('wtime', 'winc') if self.gs.whiteToMove else ('btime', 'binc')
+            if clock in limits:
+                timeLimit = allocateTime(limits[clock] / 1000, limits.get(increment, 0) / 1000, limits.get('movestogo'))
+        depth = limits.get('depth', SmartMoveFinder.MAX_DEPTH)
+        maxNodes = limits.get('nodes')
+        if self.threads > 1 and self.parallel is None:
+            # started here rather than on the search thread: a worker forked while the command loop is blocked reading
+            # standard input would hang closing its copy of it
+            self.parallel = ParallelSearch.ParallelSearch(self.threads, self.transpositionTable.sizeMB)
+        self.stopped.clear()
+        self.searcher = SmartMoveFinder.Searcher(self.transpositionTable, self.moveOrderer)
+        self.searchThread = threading.Thread(target=self.search, args=(depth, timeLimit, maxNodes), daemon=True)
+        self.searchThread.start()
+
+    def search(self, depth, timeLimit, maxNodes):
+        start = time.perf_counter()
+
+        def report(completedDepth, score, nodes, move):
+            elapsed = time.perf_counter() - start
+            self.send('info depth %d score %s nodes %d nps %d time %d pv %s' % (completedDepth, SmartMoveFinder.formatScore(score),
+                      nodes, nodes / elapsed if elapsed > 0 else 0, elapsed * 1000, ChessEngine.moveNotation(move)))
+
+        validMoves = self.gs.getValidMoves()
+        if self.parallel is not None:
+            move = self.parallel.findBestMove(self.gs, validMoves, depth, timeLimit=timeLimit, maxNodes=maxNodes)
+            if move is not None:
+                report(self.parallel.completedDepth, self.parallel.bestScore, self.parallel.nodes, move.code)
+        else:
+            move = self.searcher.findBestMove(self.gs, validMoves, depth, timeLimit=timeLimit, maxNodes=maxNodes, onIteration=report)
+        if self.infinite: # the GUI decides when an infinite search ends
+            self.stopped.wait()
+        self.send('bestmove ' + (move.getChessNotation() if move is not None else '0000'))
+
+    '''
+    Stop the running search, if there is one, and wait until it has sent its bestmove
+    '''
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.searcher.stop()
+            if self.parallel is not None:
+                self.parallel.stop()
+            self.stopped.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+    def closeParallel(self):
+        if self.parallel is not None:
+            self.parallel.close()
+            self.parallel = None
+
+    '''
+    Stop searching and let go of the worker processes
+    '''
+    def close(self):
+        self.stopSearch()
+        self.closeParallel()
+
+
+'''
+Seconds to spend on a move with remaining seconds on the clock: an even share of the time over the moves still to play
+plus most of the increment, never so much that the clock runs out
+'''
+def allocateTime(remaining, increment, movesToGo=None):
+    share = remaining / (movesToGo or MOVES_TO_GO) + increment * 0.8
+    return max(min(share, remaining - TIME_MARGIN), 0.01)
+
+
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.close()
+
+
+if __name__ == "__main__":
+    main()
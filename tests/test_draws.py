@@ -0,0 +1,116 @@
+"""
+Draw rules give the same result on both backends, and the search scores a draw by rule as one.
+"""
+import pytest
+
+import ChessEngine
+import BitboardEngine
+import SmartMoveFinder
+
+BACKENDS = [ChessEngine.GameState, BitboardEngine.BitboardGameState]
+
+# (fen, insufficient material)
+MATERIAL_POSITIONS = [
+    ('4B3/8/B7/3b4/4K3/8/6k1/8 w - - 0 109', True), # three bishops, all on light squares
+    ('4k3/8/8/8/8/8/8/4K3 w - - 0 1', True),
+    ('4k3/8/8/8/8/8/8/2N1K3 w - - 0 1', True),
+    ('4k3/8/8/8/8/8/8/2B1K3 b - - 0 1', True),
+    ('2b1k3/8/8/8/8/8/8/2B1K3 w - - 0 1', False), # bishops on opposite colors
+    ('1b2k3/8/8/8/8/8/8/2B1K3 w - - 0 1', True),
+    ('4k3/8/8/8/8/8/8/1NB1K3 w - - 0 1', False),
+    ('4k3/8/8/8/8/8/8/1NN1K3 w - - 0 1', False),
+    ('4k3/8/8/8/8/8/8/B1BB1K2 w - - 0 1', False), # bishops on both colors
+    ('4k3/8/8/8/8/8/4P3/4K3 w - - 0 1', False),
+    ('4k3/8/8/8/8/8/8/R3K3 w - - 0 1', False),
+]
+
+
+@pytest.mark.parametrize('fen, insufficient', MATERIAL_POSITIONS)
+def test_insufficient_material_same_on_both_backends(fen, insufficient):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    bitboards = BitboardEngine.BitboardGameState.fromFEN(fen)
+    assert gs.isInsufficientMaterial() == bitboards.isInsufficientMaterial() == insufficient
+    assert gs.gameStatus() == bitboards.gameStatus()
+    assert (gs.gameStatus() == ChessEngine.STATUS_INSUFFICIENT_MATERIAL) == insufficient
+
+
+def test_bishop_ending_status_same_on_both_backends():
+    fen = '4B3/8/B7/3b4/4K3/8/6k1/8 w - - 0 109'
+    gs = ChessEngine.GameState.fromFEN(fen)
+    bitboards = BitboardEngine.BitboardGameState.fromFEN(fen)
+    for ply in range(30): # the same king and bishop moves on both, every position stays a draw
+        assert gs.gameStatus() == bitboards.gameStatus() == ChessEngine.STATUS_INSUFFICIENT_MATERIAL
+        code = min(gs.getValidMoveCodes())
+        assert code == min(bitboards.getValidMoveCodes())
+        gs.makeMoveCode(code)
+        bitboards.makeMoveCode(code)
+
+
+def playMoves(gs, notations):
+    for notation in notations:
+        gs.makeMoveCode(next(code for code in gs.getValidMoveCodes() if ChessEngine.moveNotation(code) == notation))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_knight_shuffle_is_a_threefold_repetition(backend):
+    gs = backend()
+    shuffle = ['g1f3', 'g8f6', 'f3g1', 'f6g8']
+    playMoves(gs, shuffle)
+    assert gs.repetitions() == 1
+    assert gs.gameStatus() == ChessEngine.STATUS_ONGOING
+    playMoves(gs, shuffle[:3])
+    assert gs.gameStatus() == ChessEngine.STATUS_ONGOING # the position after f3g1 has only been seen twice
+    playMoves(gs, shuffle[3:])
+    assert gs.repetitions() == 2
+    assert gs.gameStatus() == ChessEngine.STATUS_REPETITION
+    gs.undoMoveCode()
+    assert gs.gameStatus() == ChessEngine.STATUS_ONGOING
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_a_pawn_move_ends_the_repetitions(backend):
+    gs = backend()
+    playMoves(gs, ['g1f3', 'g8f6', 'f3g1', 'f6g8', 'e2e3', 'e7e6', 'g1f3', 'g8f6', 'f3g1', 'f6g8'])
+    assert gs.repetitions() == 1 # the start position is out of reach after e3 e6
+    assert gs.gameStatus() == ChessEngine.STATUS_ONGOING
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_fifty_move_rule(backend):
+    gs = backend.fromFEN('4k3/8/8/8/8/8/8/R3K3 w - - 99 80')
+    assert gs.gameStatus() == ChessEngine.STATUS_ONGOING
+    playMoves(gs, ['a1a2'])
+    assert gs.halfmoveClock == 100
+    assert gs.gameStatus() == ChessEngine.STATUS_FIFTY_MOVES
+    assert SmartMoveFinder.isDrawByRule(gs)
+    gs.undoMoveCode()
+    assert gs.halfmoveClock == 99
+    playMoves(gs, ['a1a8']) # a check doesn't reset the clock
+    assert gs.gameStatus() == ChessEngine.STATUS_FIFTY_MOVES
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_mate_on_the_hundredth_ply_wins(backend):
+    gs = backend.fromFEN('6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80')
+    playMoves(gs, ['a1a8'])
+    assert gs.halfmoveClock == 100
+    assert gs.gameStatus() == ChessEngine.STATUS_CHECKMATE
+    assert not SmartMoveFinder.isDrawByRule(gs)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_search_finds_mate_on_the_hundredth_ply(backend):
+    gs = backend.fromFEN('6k1/5ppp/8/8/8/8/8/R5K1 w - - 99 80')
+    move = SmartMoveFinder.Searcher().findBestMove(gs, gs.getValidMoves(), 2)
+    assert move.getChessNotation() == 'a1a8'
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_search_scores_a_repeated_position_as_a_draw(backend):
+    gs = backend.fromFEN('4k3/8/8/8/8/8/8/3QK3 w - - 0 1')
+    playMoves(gs, ['d1d2', 'e8e7', 'd2d1'])
+    # a queen down, black's only way out is going back to e8, where the game has already been
+    searcher = SmartMoveFinder.Searcher()
+    move = searcher.findBestMove(gs, gs.getValidMoves(), 3)
+    assert move.getChessNotation() == 'e7e8'
+    assert searcher.bestScore == 0
@@ -0,0 +1,89 @@
+"""
+FEN reading and writing, on both backends.
+"""
+import pytest
+
+import ChessEngine
+import BitboardEngine
+import Perft
+
+BACKENDS = [ChessEngine.GameState, BitboardEngine.BitboardGameState]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('fen', [fen for name, fen, expected in Perft.PERFT_SUITE])
+def test_fen_round_trip(backend, fen):
+    assert backend.fromFEN(fen).toFEN() == fen
+
+
+# (fen, castling rights kept): rights whose king or rook isn't on its home square are dropped
+CASTLING_POSITIONS = [
+    ('4k3/8/8/8/8/8/8/4K3 w K - 0 1', '-'),
+    ('4k3/8/8/8/8/8/8/R3K3 w KQ - 0 1', 'Q'),
+    ('r3k2r/8/8/8/8/8/8/R4K1R w KQkq - 0 1', 'kq'),
+    ('1r2k1r1/8/8/8/8/8/8/R3K2R b KQkq - 0 1', 'KQ'),
+    ('r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1', 'KQkq'),
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('fen, castling', CASTLING_POSITIONS)
+def test_castling_rights_need_king_and_rook_at_home(backend, fen, castling):
+    gs = backend.fromFEN(fen)
+    assert gs.toFEN().split()[2] == castling
+    for code in gs.getValidMoveCodes(): # every castle move generated can be made and taken back
+        gs.makeMoveCode(code)
+        gs.undoMoveCode()
+    assert gs.toFEN().split()[2] == castling
+
+
+def test_castling_moves_same_on_both_backends():
+    for fen, castling in CASTLING_POSITIONS:
+        gs = ChessEngine.GameState.fromFEN(fen)
+        bitboards = BitboardEngine.BitboardGameState.fromFEN(fen)
+        assert sorted(gs.getValidMoveCodes()) == sorted(bitboards.getValidMoveCodes())
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('fen', [
+    'P7/8/8/8/8/8/8/k6K w - - 0 1',
+    '4k3/8/8/8/8/8/8/p3K3 b - - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNP w KQkq - 0 1',
+])
+def test_pawn_on_back_rank_is_rejected(backend, fen):
+    with pytest.raises(ValueError):
+        backend.fromFEN(fen)
+
+
+@pytest.mark.parametrize('fen', [
+    '',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP w KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNX w KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQQBNR w kq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR x KQkq - 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq e5 0 1',
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - zero 1',
+])
+def test_malformed_fen_is_rejected(fen):
+    with pytest.raises(ValueError):
+        ChessEngine.GameState.fromFEN(fen)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_game_history(backend):
+    gs = backend.fromFEN('r3k3/8/8/8/8/8/8/4K2R w Kq -') # EPD style, no move counters
+    assert gs.gameHistory() == ('r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1', [])
+    codes = []
+    for notation in ('e1g1', 'e8c8', 'f1f8'):
+        codes.append(next(code for code in gs.getValidMoveCodes() if ChessEngine.moveNotation(code) == notation))
+        gs.makeMoveCode(codes[-1])
+    fen = gs.toFEN()
+    startFen, history = gs.gameHistory()
+    assert (startFen, history) == ('r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1', codes)
+    assert gs.toFEN() == fen
+    replay = backend.fromFEN(startFen)
+    for code in history:
+        replay.makeMoveCode(code)
+    assert replay.toFEN() == fen
+    assert replay.zobristLog == gs.zobristLog
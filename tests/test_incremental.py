@@ -0,0 +1,65 @@
+"""
+The state makeMoveCode/undoMoveCode keep up to date move by move (Zobrist key, evaluation scores and, on
+ChessEngine.AttackMapGameState, attack maps) has to match a full recomputation after any sequence of moves and
+take-backs, and the bitboard backend, which keeps its own position, has to stay in step with the string one.
+"""
+import random
+
+import pytest
+
+import ChessEngine
+import BitboardEngine
+import Evaluation
+import Perft
+
+BACKENDS = [ChessEngine.GameState, ChessEngine.AttackMapGameState, BitboardEngine.BitboardGameState]
+PLIES = 60
+
+
+def checkState(gs, context):
+    gs.checkIncrementalState(context)
+    assert Evaluation.evaluate(gs) == Evaluation.evaluateBoard(gs.board), context
+
+
+@pytest.mark.parametrize('gameClass', BACKENDS, ids=lambda cls: cls.__name__)
+@pytest.mark.parametrize('name, fen', [(name, fen) for name, fen, expected in Perft.PERFT_SUITE[:6]])
+def test_random_moves_keep_incremental_state(gameClass, name, fen):
+    rng = random.Random(name)
+    gs = gameClass.fromFEN(fen)
+    checkState(gs, 'setup')
+    for ply in range(PLIES):
+        moves = gs.getValidMoveCodes()
+        if not moves:
+            break
+        code = rng.choice(moves)
+        gs.makeMoveCode(code)
+        checkState(gs, 'makeMoveCode ' + ChessEngine.moveNotation(code))
+        if rng.random() < 0.25: # take a move back now and then, and play another one
+            gs.undoMoveCode()
+            checkState(gs, 'undoMoveCode ' + ChessEngine.moveNotation(code))
+    while gs.codeLog:
+        gs.undoMoveCode()
+        checkState(gs, 'undoMoveCode')
+    assert gs.toFEN() == gameClass.fromFEN(fen).toFEN()
+
+
+@pytest.mark.parametrize('name, fen', [(name, fen) for name, fen, expected in Perft.PERFT_SUITE[:6]])
+def test_bitboard_backend_follows_the_string_backend(name, fen):
+    rng = random.Random(name)
+    gs = ChessEngine.GameState.fromFEN(fen)
+    bitboards = BitboardEngine.BitboardGameState.fromFEN(fen)
+    for ply in range(PLIES):
+        moves = gs.getValidMoveCodes()
+        assert sorted(bitboards.getValidMoveCodes()) == sorted(moves)
+        if not moves:
+            break
+        code = rng.choice(moves)
+        bitboards.board # the 8x8 board built before the move has to be dropped by makeMoveCode and back after undo
+        for state in (gs, bitboards):
+            state.makeMoveCode(code)
+        assert bitboards.toFEN() == gs.toFEN()
+        assert (bitboards.whiteKingLocation, bitboards.blackKingLocation) == (gs.whiteKingLocation, gs.blackKingLocation)
+        if rng.random() < 0.25:
+            for state in (gs, bitboards):
+                state.undoMoveCode()
+            assert bitboards.toFEN() == gs.toFEN()
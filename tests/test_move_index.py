@@ -0,0 +1,60 @@
+"""
+Looking valid moves up by square in a MoveIndex, as the GUI does for clicks and highlights.
+"""
+import pytest
+
+import ChessEngine
+import BitboardEngine
+
+BACKENDS = [ChessEngine.GameState, BitboardEngine.BitboardGameState]
+FEN = '1r5k/P7/8/8/8/8/8/K7 w - - 0 1' # the a7 pawn promotes on a8 or by taking on b8
+A7, A8, B8, A1, A2, B1 = (1, 0), (0, 0), (0, 1), (7, 0), (6, 0), (7, 1)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_find_promotion_needs_the_piece(backend):
+    index = backend.fromFEN(FEN).getValidMoveIndex()
+    knight = index.find(A7, A8, 'N')
+    assert knight.getChessNotation() == 'a7a8n'
+    assert knight.promotionChoice == 'N'
+    assert index.find(A7, A8) is None
+    assert len({index.find(A7, B8, piece).getChessNotation() for piece in ChessEngine.PROMOTION_PIECES}) == 4
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_find_other_moves(backend):
+    index = backend.fromFEN(FEN).getValidMoveIndex()
+    assert index.find(A1, A2).getChessNotation() == 'a1a2'
+    assert index.find(A1, A2, 'Q') is None
+    assert index.find(A1, B1) is None # attacked by the rook
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_is_promotion(backend):
+    index = backend.fromFEN(FEN).getValidMoveIndex()
+    assert index.isPromotion(A7, A8)
+    assert index.isPromotion(A7, B8)
+    assert not index.isPromotion(A1, A2)
+    assert not index.isPromotion(A7, (0, 2)) # not a valid move at all
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_moves_from(backend):
+    index = backend.fromFEN(FEN).getValidMoveIndex()
+    assert sorted(move.getChessNotation() for move in index.movesFrom(A7)) == \
+        ['a7a8b', 'a7a8n', 'a7a8q', 'a7a8r', 'a7b8b', 'a7b8n', 'a7b8q', 'a7b8r']
+    assert sorted(move.getChessNotation() for move in index.movesFrom(A1)) == ['a1a2']
+    assert index.movesFrom((4, 4)) == []
+    assert index.movesFrom(B8) == [] # the other side's piece
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_index_is_rebuilt_after_a_move(backend):
+    gs = backend.fromFEN(FEN)
+    index = gs.getValidMoveIndex()
+    assert gs.getValidMoveIndex() is index
+    gs.makeMove(index.find(A7, B8, 'Q'))
+    assert gs.getValidMoveIndex() is not index
+    assert gs.getValidMoveIndex().movesFrom(A7) == []
+    gs.undoMove()
+    assert gs.getValidMoveIndex().find(A7, A8, 'N').getChessNotation() == 'a7a8n'
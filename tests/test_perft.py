@@ -0,0 +1,16 @@
+"""
+Move generation counts: the Perft.py suite entries up to depth 3 on every backend.
+"""
+import pytest
+
+import EPD
+import Perft
+
+MAX_DEPTH = 3 # deeper entries take seconds each, run them with Perft.py --suite
+
+
+@pytest.mark.parametrize('backend', sorted(EPD.BACKENDS))
+@pytest.mark.parametrize('name, fen, depth, expected', [(name, fen, depth, nodes) for name, fen, counts in Perft.PERFT_SUITE
+                                                        for depth, nodes in sorted(counts.items()) if depth <= MAX_DEPTH])
+def test_perft_suite(backend, name, fen, depth, expected):
+    assert Perft.perft(EPD.BACKENDS[backend].fromFEN(fen), depth) == expected
@@ -0,0 +1,158 @@
+"""
+SAN and PGN reading and writing.
+"""
+import io
+import random
+
+import pytest
+
+import ChessEngine
+import BitboardEngine
+import PGN
+
+BACKENDS = [ChessEngine.GameState, BitboardEngine.BitboardGameState]
+
+# (fen, coordinate move, SAN)
+SAN_MOVES = [
+    (ChessEngine.START_FEN, 'g1f3', 'Nf3'),
+    (ChessEngine.START_FEN, 'e2e4', 'e4'),
+    ('4k3/8/8/8/8/8/4K3/R6R w - - 0 1', 'a1d1', 'Rad1'), # file disambiguation
+    ('R7/8/7k/8/8/8/8/R3K3 w - - 0 1', 'a1a4', 'R1a4'), # rank disambiguation
+    ('7k/8/8/8/8/Q7/8/Q1Q1K3 w - - 0 1', 'a1b2', 'Qa1b2+'), # both
+    ('rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3', 'e5f6', 'exf6'), # en passant
+    ('1r5k/P7/8/8/8/8/8/K7 w - - 0 1', 'a7a8q', 'a8=Q'),
+    ('1r5k/P7/8/8/8/8/8/K7 w - - 0 1', 'a7b8n', 'axb8=N'),
+    ('1r5k/P7/8/8/8/8/8/K7 w - - 0 1', 'a7b8q', 'axb8=Q+'),
+    ('r3k3/8/8/8/8/8/8/4K3 b q - 0 1', 'e8c8', 'O-O-O'),
+    ('6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1', 'a1a8', 'Ra8#'),
+]
+
+
+def moveCode(gs, notation):
+    return next(code for code in gs.getValidMoveCodes() if ChessEngine.moveNotation(code) == notation)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('fen, notation, san', SAN_MOVES)
+def test_san_both_ways(backend, fen, notation, san):
+    gs = backend.fromFEN(fen)
+    code = moveCode(gs, notation)
+    assert gs.sanNotation(code) == san
+    assert PGN.sanToMoveCode(gs, san, gs.getValidMoveCodes()) == code
+
+
+@pytest.mark.parametrize('fen, san', [
+    ('4k3/8/8/8/8/8/4K3/R6R w - - 0 1', 'Rd1'), # ambiguous
+    ('1r5k/P7/8/8/8/8/8/K7 w - - 0 1', 'a8'), # promotion without a piece
+    ('1r5k/P7/8/8/8/8/8/K7 w - - 0 1', 'a8=K'),
+    (ChessEngine.START_FEN, 'e5'),
+    (ChessEngine.START_FEN, 'O-O'),
+    (ChessEngine.START_FEN, 'Zz9'),
+])
+def test_bad_san_is_rejected(fen, san):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    with pytest.raises(ValueError):
+        PGN.sanToMoveCode(gs, san, gs.getValidMoveCodes())
+
+
+def test_optional_san_marks_are_accepted():
+    gs = ChessEngine.GameState.fromFEN('1r5k/P7/8/8/8/8/8/K7 w - - 0 1')
+    code = moveCode(gs, 'a7b8q')
+    for san in ('axb8=Q+', 'axb8Q', 'ab8=q', 'axb8=Q!?'):
+        assert PGN.sanToMoveCode(gs, san, gs.getValidMoveCodes()) == code
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_random_games_round_trip(backend):
+    rng = random.Random(7)
+    for _ in range(10):
+        gs = backend()
+        for ply in range(rng.randrange(20, 120)):
+            codes = gs.getValidMoveCodes()
+            if not codes:
+                break
+            gs.makeMoveCode(rng.choice(codes))
+        output = io.StringIO()
+        PGN.writeGame(output, gs, {'Event': 'test'})
+        games = list(PGN.readGames(io.StringIO(output.getvalue()), gameClass=backend))
+        assert len(games) == 1
+        assert games[0].error is None
+        assert [move.code for move in games[0].moves] == gs.codeLog
+        assert games[0].tags['Event'] == 'test'
+
+
+def test_game_from_fen_round_trip():
+    fen = 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R b KQkq - 3 17'
+    gs = ChessEngine.GameState.fromFEN(fen)
+    for notation in ('e8g8', 'e1c1', 'b4c3'):
+        gs.makeMoveCode(moveCode(gs, notation))
+    output = io.StringIO()
+    PGN.writeGame(output, gs)
+    assert '17... O-O 18. O-O-O bxc3' in output.getvalue()
+    game, = PGN.readGames(io.StringIO(output.getvalue()))
+    assert game.tags['FEN'] == fen
+    assert [move.code for move in game.moves] == gs.codeLog
+
+
+GAMES = '''[Event "one"]
+[Result "1-0"]
+
+1. e4 {best by test} e5 $1 2. Nf3 (2. f4 exf4 (2... d5) 3. Nf3) 2... Nc6 ; a line comment
+3. Bb5 {a comment
+over two lines} a6 4. Ba4!? 1-0
+
+[Event "bad FEN"]
+[SetUp "1"]
+[FEN "P7/8/8/8/8/8/8/k6K w - - 0 1"]
+
+1. Kg2 *
+
+[Event "bad move"]
+
+1. e4 e5 2. Ke3 Nc6 *
+
+[Event "two"]
+
+1. d4 d5 1/2-1/2
+'''
+
+
+def test_read_games_skips_comments_variations_and_nags():
+    games = list(PGN.readGames(io.StringIO(GAMES)))
+    assert [game.tags['Event'] for game in games] == ['one', 'bad FEN', 'bad move', 'two']
+    first = games[0]
+    assert first.error is None
+    assert first.result == '1-0'
+    assert [move.getChessNotation() for move in first.moves] == ['e2e4', 'e7e5', 'g1f3', 'b8c6', 'f1b5', 'a7a6', 'b5a4']
+
+
+def test_read_games_goes_on_after_a_bad_game():
+    games = list(PGN.readGames(io.StringIO(GAMES)))
+    badFen, badMove, last = games[1:]
+    assert badFen.error.startswith('bad FEN tag')
+    assert badFen.moves == []
+    assert badMove.error == 'illegal move Ke3'
+    assert len(badMove.moves) == 2
+    assert last.error is None
+    assert last.result == '1/2-1/2'
+    assert len(last.moves) == 2
+
+
+class BrokenGameState(ChessEngine.GameState):
+    def makeMoveCode(self, code):
+        if ChessEngine.moveNotation(code) == 'd2d4':
+            raise KeyError('-')
+        super().makeMoveCode(code)
+
+
+def test_read_games_goes_on_after_any_error():
+    games = list(PGN.readGames(io.StringIO(GAMES), gameClass=BrokenGameState))
+    assert len(games) == 4
+    assert games[3].error == "KeyError: '-'"
+    assert games[3].moves == []
+
+
+def test_tags_only():
+    games = list(PGN.readGames(io.StringIO(GAMES), parseMoves=False))
+    assert [game.result for game in games] == ['1-0', '*', '*', '1/2-1/2']
+    assert all(game.moves == [] and game.error is None for game in games)
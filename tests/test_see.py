@@ -0,0 +1,36 @@
+"""
+Static exchange evaluation of captures, promotions and quiet moves.
+"""
+import pytest
+
+import ChessEngine
+import MoveOrdering
+from MoveOrdering import SEE_VALUES
+
+P, N, B, R, Q = (SEE_VALUES[piece] for piece in 'PNBRQ')
+
+# (fen, move, material won by the side making the move)
+EXCHANGES = [
+    ('1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1', 'e1e5', P), # undefended pawn
+    ('1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1', 'd3e5', P - N), # black stops after winning the knight
+    ('4k3/8/2p5/3p4/5N2/8/8/4K3 w - - 0 1', 'f4d5', P - N),
+    ('4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1', 'd1d5', P - Q),
+    ('4r1k1/8/8/4p3/8/8/4R3/4R1K1 w - - 0 1', 'e2e5', P), # the rook behind joins in through the first one
+    ('4r1k1/4r3/8/4p3/8/8/4R3/4R1K1 w - - 0 1', 'e2e5', P - R),
+    ('4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1', 'e5d6', P), # en passant
+    ('6k1/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7a8q', Q - P),
+    ('1r4k1/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7a8q', Q - P - Q),
+    ('1r4k1/P7/8/8/8/8/8/4K3 w - - 0 1', 'a7b8q', R + Q - P),
+    ('4k3/3p4/8/8/3N4/8/8/4K3 w - - 0 1', 'd4f5', 0), # quiet move to a safe square
+    ('4k3/3p4/8/8/3N4/8/8/4K3 w - - 0 1', 'd4e6', -N), # quiet move onto a pawn's capture
+    ('3k4/8/8/8/8/8/3q4/4K3 w - - 0 1', 'e1d2', Q), # a king captures an undefended piece
+    ('4k3/3p4/8/8/8/8/8/3QK3 w - - 0 1', 'd1d7', P - Q), # a king recaptures
+    ('4k3/3p4/8/8/8/8/3Q4/3RK3 w - - 0 1', 'd2d7', P), # but not on a defended square
+]
+
+
+@pytest.mark.parametrize('fen, notation, expected', EXCHANGES)
+def test_static_exchange(fen, notation, expected):
+    gs = ChessEngine.GameState.fromFEN(fen)
+    code = next(code for code in gs.getValidMoveCodes() if ChessEngine.moveNotation(code) == notation)
+    assert MoveOrdering.staticExchange(gs.board, code) == expected